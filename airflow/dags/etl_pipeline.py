@@ -1,14 +1,17 @@
 from airflow import DAG
+from airflow.exceptions import AirflowSkipException
 from airflow.operators.python import PythonOperator
 from datetime import datetime, timedelta
-import pandas as pd
 import os
 import sys
 sys.path.append("/opt/airflow/scripts")
+sys.path.append("/opt/airflow/app")
 
 from extract import extract_student_data
-from transform import load_and_transform
-from load import load_to_sqlite
+from transform import combine_transformed, discover_subjects, transform_partition
+from load import load_to_postgres, load_to_sqlite
+from render import render_plots
+from dataset import parquet_path_for
 
 default_args = {
     'owner': 'airflow',
@@ -20,6 +23,55 @@ default_args = {
     'email_on_success': False,
 }
 
+
+def list_partitions(archive):
+    """One transform_partition call per subject file, so new subjects get their own task."""
+    # Without an archive discover_subjects would list whatever stale CSVs are in data/
+    if not archive:
+        raise ValueError("extract found no dataset archive to transform")
+    return [
+        {"subject": subject, "file_name": file_name, "archive": archive}
+        for subject, file_name in discover_subjects(archive=archive).items()
+    ]
+
+
+def upload_files(transformed_csv, prefix=""):
+    """The transformed outputs published to cloud storage.
+
+    Objects are named prefix + file name, matching the keys the dashboard's
+    upload buttons use for each target, so both share one upload ledger
+    entry per artifact.
+    """
+    return {
+        path: prefix + os.path.basename(path)
+        for path in (transformed_csv, parquet_path_for(transformed_csv)) if os.path.exists(path)
+    }
+
+
+def load_postgres(transformed_csv):
+    if not os.getenv("POSTGRES_URL"):
+        raise AirflowSkipException("POSTGRES_URL is not set")
+    load_to_postgres(transformed_csv, mode="merge")
+
+
+def upload_s3(transformed_csv):
+    if not os.getenv("S3_BUCKET_NAME"):
+        raise AirflowSkipException("S3_BUCKET_NAME is not set")
+    from s3_utils import upload_files_to_s3
+    results = upload_files_to_s3(upload_files(transformed_csv))
+    if not all(results.values()):
+        raise RuntimeError(f"S3 upload failed: {results}")
+
+
+def upload_azure(transformed_csv):
+    if not os.getenv("AZURE_STORAGE_CONNECTION_STRING"):
+        raise AirflowSkipException("AZURE_STORAGE_CONNECTION_STRING is not set")
+    from azure_sb import upload_files_to_azure
+    results = upload_files_to_azure(upload_files(transformed_csv, prefix="output/"))
+    if not all(results.values()):
+        raise RuntimeError(f"Azure upload failed: {results}")
+
+
 with DAG(
     dag_id="etl_pipeline",
     default_args=default_args,
@@ -27,21 +79,71 @@ with DAG(
     start_date=datetime(2025, 4, 10),
     schedule='@daily',
     catchup=False
-    
+
 ) as dag:
 
+    # Only download the archive; transform streams the CSVs out of it, so the
+    # raw files are never written to data/
     extract = PythonOperator(
         task_id="extract",
-        python_callable=extract_student_data
+        python_callable=extract_student_data,
+        op_kwargs={"materialize": False}
     )
 
-    transform = PythonOperator(
+    partitions = PythonOperator(
+        task_id="list_partitions",
+        python_callable=list_partitions,
+        op_kwargs={"archive": extract.output}
+    )
+
+    # Dynamic task mapping: one transform task per subject, run in parallel
+    transform = PythonOperator.partial(
         task_id="transform",
-        python_callable=load_and_transform
+        python_callable=transform_partition,
+    ).expand(op_kwargs=partitions.output)
+
+    # Tasks pass file paths to each other through XCom, never the data itself
+    combine = PythonOperator(
+        task_id="combine",
+        python_callable=combine_transformed,
+        op_kwargs={"partitions": transform.output}
     )
 
-    load = PythonOperator(
-        task_id="load",
-        python_callable=load_to_sqlite
+    transformed_csv = combine.output
+
+    # Everything below only reads the combined output, so it runs concurrently
+    # and the run takes as long as the slowest branch
+
+    # Only apply the rows that changed since the last run
+    load_sqlite = PythonOperator(
+        task_id="load_sqlite",
+        python_callable=load_to_sqlite,
+        op_kwargs={"transformed_csv": transformed_csv, "mode": "merge"}
     )
-    extract >> transform >> load
\ No newline at end of file
+
+    load_pg = PythonOperator(
+        task_id="load_postgres",
+        python_callable=load_postgres,
+        op_kwargs={"transformed_csv": transformed_csv}
+    )
+
+    upload_to_s3 = PythonOperator(
+        task_id="upload_s3",
+        python_callable=upload_s3,
+        op_kwargs={"transformed_csv": transformed_csv}
+    )
+
+    upload_to_azure = PythonOperator(
+        task_id="upload_azure",
+        python_callable=upload_azure,
+        op_kwargs={"transformed_csv": transformed_csv}
+    )
+
+    render = PythonOperator(
+        task_id="render_plots",
+        python_callable=render_plots,
+        op_kwargs={"data_path": transformed_csv}
+    )
+
+    extract >> partitions >> transform >> combine
+    combine >> [load_sqlite, load_pg, upload_to_s3, upload_to_azure, render]
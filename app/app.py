@@ -1,20 +1,19 @@
 import streamlit as st
 import pandas as pd
 import matplotlib.pyplot as plt
-import seaborn as sns
 import os
 import sys
 import warnings
 from pathlib import Path
 from dotenv import load_dotenv
-from sklearn.model_selection import train_test_split
-from sklearn.ensemble import RandomForestRegressor
-from sklearn.metrics import mean_squared_error
+sys.path.append('scripts')
 from s3_utils import upload_file_to_s3
 from azure_sb import upload_file_to_azure
-import subprocess
-sys.path.append('scripts')
-import visualize
+from render import render_plots
+from aggregates import box_stats
+from model import FEATURES, TARGET
+from data_access import (data_version, filtered_aggregates, filtered_count, filtered_page, filtered_rows,
+                         load_dataset, model_registry, query_backend, sidebar_options, table_columns)
 # Streamlit config
 st.set_page_config(
     page_title="Student Performance Analysis",
@@ -28,6 +27,9 @@ warnings.filterwarnings("ignore")
 # Load environment variables
 load_dotenv()
 
+# Rows per page offered by the student table
+PAGE_SIZES = [25, 50, 100, 500]
+
 # Set project root
 parent_dir = Path(__file__).resolve().parent.parent
 sys.path.append(str(parent_dir))
@@ -38,32 +40,54 @@ st.sidebar.title("Navigation")
 
 # Load transformed data
 df_path = "output/transformed_students.csv"
-if not os.path.exists(df_path):
+try:
+    # A SQL backend (DASHBOARD_BACKEND) answers queries without loading the dataset
+    backend = query_backend(df_path)
+except (FileNotFoundError, ImportError, ValueError) as e:
+    # Missing backend data, a missing driver or an unknown DASHBOARD_BACKEND
+    st.error(str(e))
+    st.stop()
+if backend is None and not os.path.exists(df_path):
     st.error("The dataset file does not exist.")
     st.stop()
 
-df = pd.read_csv(df_path)
+df = None if backend else load_dataset(df_path)
 
 # Sidebar filters
 st.sidebar.header("Filter Students")
-gender_options = ["All"] + sorted(df['sex'].unique().tolist())
+filter_options = sidebar_options(df_path)
+gender_options = ["All"] + filter_options["genders"]
 gender = st.sidebar.selectbox("Select Gender:", options=gender_options)
 age = st.sidebar.slider(
     "Select Age Range:",
-    min_value=int(df['age'].min()),
-    max_value=int(df['age'].max()),
-    value=(int(df['age'].min()), int(df['age'].max()))
+    min_value=filter_options["age_min"],
+    max_value=filter_options["age_max"],
+    value=(filter_options["age_min"], filter_options["age_max"])
 )
 
-# Filtered DataFrame
-filtered_df = df[
-    ((df['sex'] == gender) if gender != "All" else True) &
-    (df['age'] >= age[0]) &
-    (df['age'] <= age[1])
-]
-
-st.write(f"🎯 Filtered Students: {len(filtered_df)}")
-st.dataframe(filtered_df)
+# Filtered table: only the visible page is fetched and sent to the browser
+filters = {'sex': gender} if gender != "All" else {}
+filtered_total = filtered_count(df_path, filters, age[0], age[1])
+
+st.write(f"🎯 Filtered Students: {filtered_total}")
+all_columns = table_columns(df_path)
+shown_columns = st.multiselect("Columns:", options=all_columns, default=all_columns)
+col_sort, col_order, col_size, col_page = st.columns(4)
+sort_by = col_sort.selectbox("Sort by:", options=["(none)"] + all_columns)
+descending = col_order.selectbox("Order:", options=["Ascending", "Descending"]) == "Descending"
+page_size = col_size.selectbox("Rows per page:", options=PAGE_SIZES, index=1)
+page_count = max(1, -(-filtered_total // page_size))
+page = col_page.number_input(f"Page (of {page_count}):", min_value=1, max_value=page_count, value=1)
+
+page_df = filtered_page(
+    df_path, filters, age[0], age[1],
+    columns=shown_columns or None,
+    sort_by=None if sort_by == "(none)" else sort_by,
+    descending=descending,
+    page=page - 1,
+    page_size=page_size,
+)
+st.dataframe(page_df)
 
 # Sidebar Option Selection
 options = ["Visualize Data", "Predict Final Grade"]
@@ -73,42 +97,34 @@ selected_option = st.sidebar.selectbox("Choose an option:", options)
 if selected_option == "Visualize Data":
     st.header("📊 Visualizations")
 
-    import subprocess
     from datetime import datetime
     import humanize  # Import humanize library
 
-    # Regenerate Button
+    # Regenerate Button: only plots whose data or code changed are redrawn
     if st.button("🔄 Regenerate Visualizations"):
         try:
-            result = subprocess.run(
-                [sys.executable, "visualize.py"],
-                capture_output=True,
-                text=True,
-                check=True
-            )
-            st.success("Visualizations regenerated successfully!")
-        except subprocess.CalledProcessError as e:
+            rendered = render_plots(df_path, df=df, lazy=backend is not None)
+            st.success(f"Visualizations regenerated successfully! ({len(rendered)} updated)")
+        except Exception as e:
             st.error("Failed to regenerate visualizations.")
-            st.text(e.stderr)
+            st.text(str(e))
 
     # Directory and file check
     image_dir = Path("output")
     image_files = sorted(image_dir.glob("*.png"))
 
     if not image_files:
-        st.warning("No visualizations found. Please run visualize.py first.")
+        st.warning("No visualizations found. Generating them now.")
 
         try:
-            result = subprocess.run(
-                [sys.executable, "visualize.py"],
-                capture_output=True,
-                text=True,
-                check=True
-            )
+            render_plots(df_path, df=df, lazy=backend is not None)
             st.success("Visualizations generated successfully!")
-        except subprocess.CalledProcessError as e:
+        except Exception as e:
             st.error("Failed to generate visualizations.")
-            st.text(e.stderr)
+            st.text(str(e))
+        image_files = sorted(image_dir.glob("*.png"))
+
+    if not image_files:
         st.stop()
     else:
         # Get latest modification time
@@ -143,25 +159,22 @@ if selected_option == "Visualize Data":
 if selected_option == "Predict Final Grade":
     st.header("🧠 Predict Final Grade Using ML")
 
-    # Features and target
+    # Trained once per dataset version and filter selection, then reused
     try:
-        features = filtered_df[['studytime', 'G_avg', 'absences']]
-        target = filtered_df['G3']
-
-        X_train, X_test, y_train, y_test = train_test_split(
-            features, target, test_size=0.2, random_state=42
+        # Only the model's columns are fetched for the filtered rows
+        filtered_df = filtered_rows(df_path, filters, age[0], age[1], columns=FEATURES + [TARGET])
+        result = model_registry().get_or_train(
+            filtered_df,
+            dataset_version=data_version(df_path),
+            filters={'sex': gender, 'age': list(age)},
         )
-
-        model = RandomForestRegressor(n_estimators=100, random_state=42)
-        model.fit(X_train, y_train)
-
-        predictions = model.predict(X_test)
-        mse = mean_squared_error(y_test, predictions)
+        predictions = result["predictions"]
+        mse = result["mse"]
 
         st.write(f"✅ Mean Squared Error: {mse:.2f}")
 
         st.subheader("🔍 Feature Importance")
-        importances = pd.Series(model.feature_importances_, index=features.columns)
+        importances = pd.Series(result["importances"])
         st.bar_chart(importances.sort_values(ascending=False))
 
         if st.checkbox("Save Predictions"):
@@ -183,35 +196,27 @@ if selected_option == "Predict Final Grade":
 # --- Optional Visual Explorations ---
 st.sidebar.markdown("---")
 if st.sidebar.checkbox("More Visuals"):
-    st.subheader("Gender vs Final Grade")
-    fig, ax = plt.subplots()
-    sns.boxplot(x='sex', y='G3', data=filtered_df, ax=ax)
-    st.pyplot(fig)
-
-    st.subheader("Class Failures vs Final Grade")
-    fig, ax = plt.subplots()
-    sns.boxplot(x='failures', y='G3', data=filtered_df, ax=ax)
-    st.pyplot(fig)
-
-    st.subheader("Study Time vs Final Grade")
-    fig, ax = plt.subplots()
-    sns.boxplot(x='studytime', y='G3', data=filtered_df, ax=ax)
-    st.pyplot(fig)
-
-    st.subheader("Absences vs Final Grade")
-    fig, ax = plt.subplots()
-    sns.boxplot(x='absences', y='G3', data=filtered_df, ax=ax)
-    st.pyplot(fig)
-
-    st.subheader("Mother’s Education vs Final Grade")
-    fig, ax = plt.subplots()
-    sns.boxplot(x='Medu', y='G3', data=filtered_df, ax=ax)
-    st.pyplot(fig)
-
-    st.subheader("Parental Cohabitation vs Final Grade")
-    fig, ax = plt.subplots()
-    sns.boxplot(x='Pstatus', y='G3', data=filtered_df, ax=ax)
-    st.pyplot(fig)
+    # Box plot statistics for every column come from one pass over the filtered rows
+    aggregates = filtered_aggregates(df_path, filters, age[0], age[1])
+    box_plots = [
+        ("Gender vs Final Grade", 'sex'),
+        ("Class Failures vs Final Grade", 'failures'),
+        ("Study Time vs Final Grade", 'studytime'),
+        ("Absences vs Final Grade", 'absences'),
+        ("Mother’s Education vs Final Grade", 'Medu'),
+        ("Parental Cohabitation vs Final Grade", 'Pstatus'),
+    ]
+    for title, column in box_plots:
+        st.subheader(title)
+        if aggregates[column].empty:
+            st.info("No students match the current filters.")
+            continue
+        fig, ax = plt.subplots()
+        ax.bxp(box_stats(aggregates[column]))
+        ax.set_xlabel(column)
+        ax.set_ylabel('G3')
+        st.pyplot(fig)
+        plt.close(fig)
 
 # --- Downloads ---
 st.sidebar.markdown("---")
@@ -1,26 +1,88 @@
-from azure.storage.blob import BlobServiceClient
-from azure.storage.blob import BlobClient
-from azure.storage.blob import ContainerClient
+from azure.core.exceptions import ResourceExistsError, ResourceNotFoundError
+from azure.storage.blob import BlobBlock, BlobServiceClient, ContentSettings
+import base64
+import functools
+import hashlib
 import os
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
+from manifest import fingerprint
+from upload_ledger import default_ledger
 load_dotenv()
 
+# Transfer settings, overridable through the environment
+BLOCK_SIZE = int(os.getenv("AZURE_BLOCK_SIZE", 4 * 1024 * 1024))
+MAX_CONCURRENCY = int(os.getenv("AZURE_MAX_CONCURRENCY", 4))
 
-def upload_file_to_azure(file_name, container_name, blob_name=None):
+# "skip_if_same" re-sends a file only if its MD5 differs from the blob's,
+# "overwrite" always sends it, "fail_if_exists" errors if the blob exists
+UPLOAD_MODES = ("skip_if_same", "overwrite", "fail_if_exists")
+
+
+@functools.lru_cache(maxsize=None)
+def _service_client(connection_str):
+    return BlobServiceClient.from_connection_string(connection_str)
+
+
+def get_blob_service_client():
+    """Returns the shared BlobServiceClient for AZURE_STORAGE_CONNECTION_STRING.
+
+    The connection string can point at Azurite for local testing.
+    """
+    connection_str = os.getenv("AZURE_STORAGE_CONNECTION_STRING")
+    if not connection_str:
+        return None
+    return _service_client(connection_str)
+
+
+def file_md5(file_name, block_size=1 << 20):
+    digest = hashlib.md5()
+    with open(file_name, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.digest()
+
+
+def staged_upload(blob_client, file_name, content_settings, block_size=BLOCK_SIZE, max_concurrency=MAX_CONCURRENCY):
+    """Uploads a file as a block blob, staging its blocks in parallel."""
+    block_count = max(1, -(-os.path.getsize(file_name) // block_size))
+
+    def stage(index):
+        with open(file_name, "rb") as f:
+            f.seek(index * block_size)
+            data = f.read(block_size)
+        block_id = base64.b64encode(f"{index:08d}".encode()).decode()
+        blob_client.stage_block(block_id, data)
+        return BlobBlock(block_id=block_id)
+
+    with ThreadPoolExecutor(max_workers=max_concurrency) as pool:
+        blocks = list(pool.map(stage, range(block_count)))
+    # Nothing is visible until the block list is committed
+    blob_client.commit_block_list(blocks, content_settings=content_settings)
+
+
+def upload_file_to_azure(file_name, container_name=None, blob_name=None, mode="skip_if_same",
+                         block_size=BLOCK_SIZE, max_concurrency=MAX_CONCURRENCY, use_ledger=True):
     """Upload a file to an Azure Blob Storage container
 
     :param file_name: File to upload
-    :param container_name: Container to upload to
+    :param container_name: Container to upload to. If not specified, AZURE_CONTAINER_NAME is used
     :param blob_name: Blob name. If not specified, file_name is used
-    :return: True if file was uploaded, else False
-    Uses environment variables for connection string and container name
+    :param mode: One of UPLOAD_MODES
+    :param block_size: Size of each staged block
+    :param max_concurrency: Blocks staged in parallel
+    :param use_ledger: Skip files the upload ledger shows as already sent (unless
+        mode is "overwrite") and record uploads in the ledger
+    :return: True if file was uploaded (or already up to date), else False
+    Uses environment variables for the connection string
     """
+    if mode not in UPLOAD_MODES:
+        raise ValueError(f"mode must be one of {UPLOAD_MODES}, not {mode!r}")
 
-    # Get values from the environment variables
-    connection_str = os.getenv("AZURE_STORAGE_CONNECTION_STRING")
-    container_name = os.getenv("AZURE_CONTAINER_NAME")
+    blob_service_client = get_blob_service_client()
+    container_name = container_name or os.getenv("AZURE_CONTAINER_NAME")
 
-    if not connection_str or not container_name:
+    if not blob_service_client or not container_name:
         print("Error: Missing environment variables for Azure Storage connection.")
         return False
 
@@ -28,48 +90,64 @@ def upload_file_to_azure(file_name, container_name, blob_name=None):
     # If blob_name was not specified, use file_name
     if blob_name is None:
         blob_name = os.path.basename(file_name)
-    
+
+
+    target = f"azure://{container_name}/{blob_name}"
+    ledger = default_ledger() if use_ledger else None
 
     try:
-        # Create a BlobServiceClient
-        blob_service_client = BlobServiceClient.from_connection_string(connection_str)
-        # Create a ContainerClient
-        container_client = blob_service_client.get_container_client(container_name)
-        # Create a BlobClient
-        blob_client = container_client.get_blob_client(blob_name)
-        # Upload the file
-        with open(file_name, "rb") as data:
-            blob_client.upload_blob(data)
-            print(f"Uploaded {file_name} to {container_name}/{blob_name}")
+        blob_client = blob_service_client.get_container_client(container_name).get_blob_client(blob_name)
+
+        properties = None
+        if mode != "overwrite":
+            try:
+                properties = blob_client.get_blob_properties()
+            except ResourceNotFoundError:
+                properties = None
+            if properties is not None:
+                if mode == "fail_if_exists":
+                    raise ResourceExistsError(f"Blob {container_name}/{blob_name} already exists")
+                # The ledger avoids even hashing the file when nothing changed on either side
+                recorded = ledger.lookup(target, file_name) if ledger else None
+                if recorded and recorded["remote_etag"] == properties.etag:
+                    print(f"Skipped {file_name}: {container_name}/{blob_name} is unchanged")
+                    return True
+
+        file_fingerprint = fingerprint(file_name)
+        # The whole-file MD5 is stored on the blob so later uploads can compare against it
+        md5 = file_md5(file_name)
+        content_settings = ContentSettings(content_md5=bytearray(md5))
+        if mode == "skip_if_same" and properties is not None:
+            if properties.content_settings.content_md5 and bytes(properties.content_settings.content_md5) == md5:
+                if ledger:
+                    ledger.record(target, file_fingerprint, properties.etag)
+                print(f"Skipped {file_name}: {container_name}/{blob_name} is unchanged")
+                return True
+
+        # Upload the file: one request when it fits in a block, staged blocks otherwise
+        if os.path.getsize(file_name) <= block_size:
+            with open(file_name, "rb") as data:
+                blob_client.upload_blob(data, overwrite=True, content_settings=content_settings)
+        else:
+            staged_upload(blob_client, file_name, content_settings, block_size, max_concurrency)
+        if ledger:
+            ledger.record(target, file_fingerprint, blob_client.get_blob_properties().etag)
+        print(f"Uploaded {file_name} to {container_name}/{blob_name}")
     except Exception as e:
         print(f"Error uploading {file_name} to {container_name}/{blob_name}: {e}")
         return False
     return True
 
-    
-    
-    
-    
-    
-    
-    
-    
-    
-    
-    
-    
-    """# Create a BlobServiceClient
-    blob_service_client = BlobServiceClient.from_connection_string(os.getenv("AZURE_STORAGE_CONNECTION_STRING"))
-
-    # Create a BlobClient
-    blob_client = blob_service_client.get_blob_client(container=container_name, blob=blob_name)
-
-    # Upload the file
-    try:
-        with open(file_name, "rb") as data:
-            blob_client.upload_blob(data)
-            print(f"Uploaded {file_name} to {container_name}/{blob_name}")
-    except Exception as e:
-        print(f"Error uploading {file_name} to {container_name}/{blob_name}: {e}")
-        return False
-    return True"""
\ No newline at end of file
+
+def upload_files_to_azure(files, container_name=None, mode="skip_if_same", max_workers=4, use_ledger=True):
+    """Uploads several files in parallel
+
+    :param files: {file_name: blob_name}; blob_name may be None
+    :return: {file_name: True if uploaded or unchanged, else False}
+    """
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        futures = {
+            file_name: pool.submit(upload_file_to_azure, file_name, container_name, blob_name, mode, use_ledger=use_ledger)
+            for file_name, blob_name in files.items()
+        }
+    return {file_name: future.result() for file_name, future in futures.items()}
@@ -0,0 +1,198 @@
+import functools
+import os
+import streamlit as st
+from aggregates import BOX_DIMENSIONS, compute_aggregates
+from cube import cube_aggregates, cube_is_current, cube_path_for, read_cube
+from dataset import read_transformed, transformed_file
+from filter_index import FilterIndex
+from manifest import file_hash
+from model import ModelRegistry
+from query_backend import open_backend
+
+# Cached access to the transformed dataset for the Streamlit app.
+# The dataset is loaded once per file version and shared by every session;
+# a new version (e.g. after the transform reruns) gets a new cache entry.
+# When the transform wrote the Arrow file, the dataset is memory-mapped, so
+# every dashboard worker process shares one copy in the OS page cache.
+# With DASHBOARD_BACKEND=sqlite or duckdb (see query_backend.py) the dataset
+# is never loaded; filters and aggregations are answered in SQL instead.
+
+BACKEND = os.getenv("DASHBOARD_BACKEND", "memory")
+
+# Dataset versions kept in memory at once
+DATASET_CACHE_SIZE = 2
+# Derived aggregates kept per dataset version
+AGGREGATE_CACHE_SIZE = 64
+# Sorted row orders kept for the paginated table (one int64 per filtered row)
+SORTED_CACHE_SIZE = 8
+
+
+@functools.lru_cache(maxsize=16)
+def _content_hash(path, mtime_ns, size):
+    return file_hash(path)
+
+
+def dataset_version(csv_path):
+    """Returns the content hash of the dataset file.
+
+    The file is only re-hashed when its mtime or size changes, so this is a
+    single stat() on every rerun.
+    """
+    path = transformed_file(csv_path)
+    stat = os.stat(path)
+    return _content_hash(path, stat.st_mtime_ns, stat.st_size)
+
+
+@st.cache_resource(show_spinner=False)
+def query_backend(csv_path):
+    """Returns the SQLBackend selected by DASHBOARD_BACKEND, or None for the in-memory dataset."""
+    return open_backend(BACKEND, csv_path)
+
+
+def data_version(csv_path):
+    """Identifies the current data, whichever backend serves it."""
+    backend = query_backend(csv_path)
+    return repr(backend.version()) if backend else dataset_version(csv_path)
+
+
+@st.cache_resource(max_entries=DATASET_CACHE_SIZE, show_spinner=False)
+def _load_dataset(csv_path, version):
+    return read_transformed(csv_path)
+
+
+def load_dataset(csv_path):
+    """Returns the transformed dataset, shared across reruns and sessions.
+
+    The frame is not copied per caller, so treat it as read-only.
+    """
+    return _load_dataset(csv_path, dataset_version(csv_path))
+
+
+@st.cache_data(max_entries=AGGREGATE_CACHE_SIZE, show_spinner=False)
+def _sidebar_options(csv_path, version):
+    backend = query_backend(csv_path)
+    if backend:
+        return backend.options()
+    df = _load_dataset(csv_path, version)
+    return {
+        "genders": sorted(df['sex'].unique().tolist()),
+        "age_min": int(df['age'].min()),
+        "age_max": int(df['age'].max()),
+    }
+
+
+def sidebar_options(csv_path):
+    """Returns the gender choices and age bounds for the sidebar filters."""
+    return _sidebar_options(csv_path, data_version(csv_path))
+
+
+@st.cache_resource(max_entries=DATASET_CACHE_SIZE, show_spinner=False)
+def _filter_index(csv_path, version):
+    return FilterIndex(_load_dataset(csv_path, version))
+
+
+def filter_index(csv_path):
+    """Returns the FilterIndex for the current dataset version."""
+    return _filter_index(csv_path, dataset_version(csv_path))
+
+
+@st.cache_resource(show_spinner=False)
+def model_registry():
+    """Returns the registry of trained final grade models."""
+    return ModelRegistry()
+
+
+def _take(df, rows, columns=None):
+    """Copies only the given rows and columns out of the shared frame."""
+    if columns is None:
+        return df.iloc[rows]
+    return df.iloc[rows, df.columns.get_indexer(columns)]
+
+
+def filtered_rows(csv_path, equals, low, high, columns=None):
+    """Returns the rows matching the sidebar filters, only with the requested columns."""
+    backend = query_backend(csv_path)
+    if backend:
+        return backend.rows(equals, low, high, columns)
+    rows = filter_index(csv_path).select(equals=equals, low=low, high=high)
+    return _take(load_dataset(csv_path), rows, columns)
+
+
+@st.cache_data(max_entries=AGGREGATE_CACHE_SIZE, show_spinner=False)
+def _table_columns(csv_path, version):
+    backend = query_backend(csv_path)
+    if backend:
+        return backend.rows(limit=0).columns.tolist()
+    return _load_dataset(csv_path, version).columns.tolist()
+
+
+def table_columns(csv_path):
+    """Returns the columns the table view can show."""
+    return _table_columns(csv_path, data_version(csv_path))
+
+
+@st.cache_data(max_entries=AGGREGATE_CACHE_SIZE, show_spinner=False)
+def _filtered_count(csv_path, version, equals, low, high):
+    backend = query_backend(csv_path)
+    if backend:
+        return backend.count(dict(equals), low, high)
+    return _filter_index(csv_path, version).count(dict(equals), low, high)
+
+
+def filtered_count(csv_path, equals, low, high):
+    """Returns how many rows match the sidebar filters, without fetching them."""
+    return _filtered_count(csv_path, data_version(csv_path), tuple(sorted(equals.items())), low, high)
+
+
+@st.cache_resource(max_entries=SORTED_CACHE_SIZE, show_spinner=False)
+def _sorted_rows(csv_path, version, equals, low, high, sort_by, descending):
+    rows = _filter_index(csv_path, version).select(dict(equals), low, high)
+    if sort_by is None:
+        return rows
+    values = _load_dataset(csv_path, version)[sort_by].iloc[rows].reset_index(drop=True)
+    order = values.sort_values(ascending=not descending, kind="stable").index.to_numpy()
+    return rows[order]
+
+
+def filtered_page(csv_path, equals, low, high, columns=None, sort_by=None, descending=False,
+                  page=0, page_size=50):
+    """Returns one page of the filtered rows, sorted and only with the requested columns.
+
+    :param page: Zero-based page number
+    :param page_size: Rows per page
+    """
+    offset = page * page_size
+    backend = query_backend(csv_path)
+    if backend:
+        return backend.rows(equals, low, high, columns, sort_by, descending, limit=page_size, offset=offset)
+    version = dataset_version(csv_path)
+    rows = _sorted_rows(csv_path, version, tuple(sorted(equals.items())), low, high, sort_by, descending)
+    return _take(_load_dataset(csv_path, version), rows[offset:offset + page_size], columns)
+
+
+@st.cache_resource(max_entries=DATASET_CACHE_SIZE, show_spinner=False)
+def _load_cube(cube_path, mtime_ns):
+    return read_cube(cube_path)
+
+
+@st.cache_data(max_entries=AGGREGATE_CACHE_SIZE, show_spinner=False)
+def _filtered_aggregates(csv_path, version, equals, low, high):
+    backend = query_backend(csv_path)
+    if backend:
+        return backend.aggregates(dict(equals), low, high, BOX_DIMENSIONS)
+    if cube_is_current(csv_path):
+        # Answered from the transform's summary cube, without touching the rows
+        cube_path = cube_path_for(csv_path)
+        try:
+            cube = _load_cube(cube_path, os.stat(cube_path).st_mtime_ns)
+            return cube_aggregates(cube, BOX_DIMENSIONS, dict(equals), low, high)
+        except KeyError:
+            pass  # The cube has no grouping for these filters
+    df = _load_dataset(csv_path, version)
+    rows = _filter_index(csv_path, version).select(dict(equals), low, high)
+    return compute_aggregates(df.iloc[rows], BOX_DIMENSIONS)
+
+
+def filtered_aggregates(csv_path, equals, low, high):
+    """Returns the box plot aggregates for the rows matching the sidebar filters."""
+    return _filtered_aggregates(csv_path, data_version(csv_path), tuple(sorted(equals.items())), low, high)
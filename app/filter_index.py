@@ -0,0 +1,95 @@
+import itertools
+import numpy as np
+import pandas as pd
+
+# Default filter dimensions for the dashboard
+EQUALITY_COLUMNS = ("sex", "subject", "address")
+RANGE_COLUMN = "age"
+
+
+class FilterIndex:
+    """Answers equality + range filters without scanning the whole dataset.
+
+    Rows are sorted once by a single integer key that combines the codes of
+    the equality columns with the value of the range column. Every combination
+    of equality values then owns a contiguous run of the sorted rows, ordered by
+    the range column, so a selection is one binary search per combination plus
+    a copy of the matching row ids: proportional to the result, not the dataset.
+
+    New filter dimensions are added by listing more equality columns; the
+    number of combinations searched is the product of the cardinalities of the
+    columns left unfiltered ("All").
+    """
+
+    def __init__(self, df, equality_columns=EQUALITY_COLUMNS, range_column=RANGE_COLUMN):
+        self.equality_columns = [col for col in equality_columns if col in df.columns]
+        self.range_column = range_column
+        self.size = len(df)
+
+        # Code every equality column; missing values get a code of their own
+        self.values = {}
+        key = np.zeros(len(df), dtype=np.int64)
+        for col in self.equality_columns:
+            codes, uniques = pd.factorize(df[col], use_na_sentinel=False)
+            self.values[col] = {value: code for code, value in enumerate(uniques)}
+            key = key * len(uniques) + codes
+
+        # The range column (an integer column such as age) is the lowest "digit"
+        range_values = df[range_column].to_numpy(dtype=np.int64)
+        self.range_min = int(range_values.min()) if len(df) else 0
+        self.range_span = int(range_values.max()) - self.range_min + 1 if len(df) else 1
+        key = key * self.range_span + (range_values - self.range_min)
+
+        self.order = np.argsort(key, kind="stable")
+        self.sorted_key = key[self.order]
+
+    def select(self, equals=None, low=None, high=None):
+        """Returns the positions of matching rows, in dataset order.
+
+        :param equals: {column: value} for the equality filters to apply;
+            columns not listed match every value
+        :param low: Inclusive lower bound on the range column
+        :param high: Inclusive upper bound on the range column
+        """
+        runs = [self.order[start:end] for start, end in self._runs(equals, low, high)]
+        if not runs:
+            return np.empty(0, dtype=np.int64)
+        return np.sort(np.concatenate(runs))
+
+    def count(self, equals=None, low=None, high=None):
+        """Returns how many rows select() would return, without collecting them."""
+        return int(sum(end - start for start, end in self._runs(equals, low, high)))
+
+    def _runs(self, equals, low, high):
+        """Returns the (start, end) slices of the sorted rows that match."""
+        equals = equals or {}
+        unknown = set(equals) - set(self.equality_columns)
+        if unknown:
+            raise ValueError(f"Columns are not indexed for filtering: {sorted(unknown)}")
+        low = self.range_min if low is None else max(int(low), self.range_min)
+        high = self.range_min + self.range_span - 1 if high is None else min(int(high), self.range_min + self.range_span - 1)
+        if low > high:
+            return []
+
+        # Codes allowed for each equality column, in key order
+        allowed = []
+        for col in self.equality_columns:
+            if col in equals:
+                code = self.values[col].get(equals[col])
+                if code is None:
+                    return []
+                allowed.append([code])
+            else:
+                allowed.append(range(len(self.values[col])))
+
+        runs = []
+        for codes in itertools.product(*allowed):
+            combo = 0
+            for col, code in zip(self.equality_columns, codes):
+                combo = combo * len(self.values[col]) + code
+            base = combo * self.range_span - self.range_min
+            start = np.searchsorted(self.sorted_key, base + low, side="left")
+            end = np.searchsorted(self.sorted_key, base + high, side="right")
+            if end > start:
+                runs.append((start, end))
+        return runs
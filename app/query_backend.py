@@ -0,0 +1,145 @@
+import os
+import pandas as pd
+from sqlalchemy import text
+from sqlalchemy.exc import NoSuchModuleError
+from aggregates import BOX_DIMENSIONS, aggregates_from_counts
+from dataset import apply_dtypes, parquet_path_for
+from db import get_engine, sqlite_engine
+from load import TABLE_NAME, quote
+
+# SQL backends for the dashboard. Filters and aggregations run in the
+# database, and only the rows and columns a widget asks for are fetched, so
+# the dashboard doesn't need the whole dataset in memory.
+#
+# DASHBOARD_BACKEND selects the source:
+#   memory  the cached in-process DataFrame (default)
+#   sqlite  the students table written by load_to_sqlite (DASHBOARD_SQLITE_PATH)
+#   duckdb  the transformed Parquet file, queried in place (needs duckdb-engine)
+
+BACKENDS = ("memory", "sqlite", "duckdb")
+SQLITE_PATH = os.getenv("DASHBOARD_SQLITE_PATH", "students.db")
+# Column the age slider filters on
+RANGE_COLUMN = "age"
+# Bookkeeping columns of the sources, never returned as data
+HIDDEN_COLUMNS = ["student_key", "row_hash", "file_row_number"]
+
+
+class SQLBackend:
+    """Answers the dashboard's filtered queries in SQL.
+
+    :param engine: SQLAlchemy engine to query through
+    :param source: Table name or table expression to select from
+    :param files: Files whose stat() identifies the current data version
+    :param tiebreaker: Unique column that orders rows tied on the sort column,
+        so LIMIT/OFFSET pages neither repeat nor skip rows
+    """
+
+    def __init__(self, engine, source, files, tiebreaker):
+        self.engine = engine
+        self.source = source
+        self.files = files
+        self.tiebreaker = tiebreaker
+
+    def version(self):
+        """Changes whenever the underlying files do."""
+        return tuple(
+            (os.stat(path).st_mtime_ns, os.stat(path).st_size) if os.path.exists(path) else None
+            for path in self.files
+        )
+
+    def _where(self, equals=None, low=None, high=None):
+        clauses, params = [], {}
+        for i, (col, value) in enumerate(sorted((equals or {}).items())):
+            clauses.append(f"{quote(col)} = :value{i}")
+            params[f"value{i}"] = value
+        if low is not None:
+            clauses.append(f"{quote(RANGE_COLUMN)} >= :low")
+            params["low"] = low
+        if high is not None:
+            clauses.append(f"{quote(RANGE_COLUMN)} <= :high")
+            params["high"] = high
+        return (" WHERE " + " AND ".join(clauses) if clauses else ""), params
+
+    def query(self, sql, params=None):
+        with self.engine.connect() as conn:
+            return pd.read_sql(text(sql), conn, params=params or {})
+
+    def options(self):
+        """Returns the gender choices and age bounds for the sidebar filters."""
+        genders = self.query(f"SELECT DISTINCT {quote('sex')} FROM {self.source} ORDER BY 1")
+        bounds = self.query(f"SELECT MIN({quote(RANGE_COLUMN)}) AS low, MAX({quote(RANGE_COLUMN)}) AS high "
+                            f"FROM {self.source}")
+        return {
+            "genders": genders.iloc[:, 0].dropna().tolist(),
+            "age_min": int(bounds["low"][0]),
+            "age_max": int(bounds["high"][0]),
+        }
+
+    def count(self, equals=None, low=None, high=None):
+        where, params = self._where(equals, low, high)
+        return int(self.query(f"SELECT COUNT(*) AS n FROM {self.source}{where}", params)["n"][0])
+
+    def rows(self, equals=None, low=None, high=None, columns=None, order_by=None, descending=False,
+             limit=None, offset=0):
+        """Returns the matching rows, only with the requested columns, as a typed frame."""
+        where, params = self._where(equals, low, high)
+        column_list = ", ".join(quote(col) for col in columns) if columns else "*"
+        sql = f"SELECT {column_list} FROM {self.source}{where}"
+        order = [f"{quote(order_by)} {'DESC' if descending else 'ASC'}"] if order_by else []
+        if order or limit is not None:
+            sql += " ORDER BY " + ", ".join(order + [quote(self.tiebreaker)])
+        if limit is not None:
+            sql += " LIMIT :limit OFFSET :offset"
+            params.update(limit=limit, offset=offset)
+        df = self.query(sql, params)
+        return apply_dtypes(df.drop(columns=HIDDEN_COLUMNS, errors="ignore"))
+
+    def aggregates(self, equals=None, low=None, high=None, dimensions=BOX_DIMENSIONS, target="G3"):
+        """Box plot aggregates per dimension, from one GROUP BY dimension, target per dimension."""
+        where, params = self._where(equals, low, high)
+        grouped = {
+            dim: self.query(
+                f"SELECT {quote(dim)}, {quote(target)}, COUNT(*) AS count, "
+                f"SUM(CAST({quote('pass')} AS INTEGER)) AS pass_count "
+                f"FROM {self.source}{where} GROUP BY {quote(dim)}, {quote(target)}",
+                params,
+            )
+            for dim in dimensions
+        }
+        return aggregates_from_counts(grouped, dimensions, target)
+
+
+def sqlite_backend(db_path=SQLITE_PATH):
+    """Queries the students table that load_to_sqlite maintains."""
+    if not os.path.exists(db_path):
+        raise FileNotFoundError(f"{db_path} not found; run the load step first")
+    return SQLBackend(sqlite_engine(db_path), quote(TABLE_NAME), [db_path, db_path + "-wal"], "student_key")
+
+
+def duckdb_backend(csv_path):
+    """Queries the transformed Parquet file in place with DuckDB.
+
+    DuckDB reads only the columns and row groups a query needs. Ties are
+    broken by the row's position in the file, the order the in-memory
+    backend's stable sort keeps.
+    """
+    parquet_path = parquet_path_for(csv_path)
+    if not os.path.exists(parquet_path):
+        raise FileNotFoundError(f"{parquet_path} not found; run the transform with columnar output")
+    source = "read_parquet('" + os.path.abspath(parquet_path).replace("'", "''") + "', file_row_number=true)"
+    try:
+        engine = get_engine("duckdb:///:memory:")
+    except NoSuchModuleError:
+        raise ImportError("DASHBOARD_BACKEND=duckdb needs duckdb-engine: pip install duckdb-engine") from None
+    return SQLBackend(engine, source, [parquet_path], "file_row_number")
+
+
+def open_backend(name, csv_path):
+    """Returns the SQLBackend for name, or None for the in-memory backend."""
+    if name not in BACKENDS:
+        raise ValueError(f"DASHBOARD_BACKEND must be one of {BACKENDS}, not {name!r}")
+    if name == "sqlite":
+        return sqlite_backend()
+    if name == "duckdb":
+        return duckdb_backend(csv_path)
+    return None
@@ -1,16 +1,166 @@
 import boto3
+import functools
+import hashlib
+import json
+import math
 import os
+from concurrent.futures import ThreadPoolExecutor
+from boto3.s3.transfer import TransferConfig
+from botocore.config import Config
+from botocore.exceptions import ClientError
+from manifest import fingerprint
+from upload_ledger import default_ledger
 
-def upload_file_to_s3(file_name, bucket_name, object_name=None):
+# Transfer settings, overridable through the environment
+MULTIPART_THRESHOLD = int(os.getenv("S3_MULTIPART_THRESHOLD", 16 * 1024 * 1024))
+MULTIPART_CHUNKSIZE = int(os.getenv("S3_MULTIPART_CHUNKSIZE", 8 * 1024 * 1024))
+MAX_CONCURRENCY = int(os.getenv("S3_MAX_CONCURRENCY", 8))
+# Where in-progress multipart uploads are recorded so they can be resumed
+UPLOAD_STATE_DIR = os.getenv("S3_UPLOAD_STATE_DIR", ".s3_uploads")
+
+
+@functools.lru_cache(maxsize=None)
+def get_s3_client():
+    """Returns the shared S3 client, built once from the .env config.
+
+    S3_ENDPOINT_URL points the client at a local stand-in (moto server, MinIO).
+    Call get_s3_client.cache_clear() after changing credentials or endpoint.
+    """
+    return boto3.client(
+        's3',
+        aws_access_key_id=os.getenv("AWS_ACCESS_KEY_ID"),
+        aws_secret_access_key=os.getenv("AWS_SECRET_ACCESS_KEY"),
+        region_name=os.getenv("AWS_DEFAULT_REGION"),
+        endpoint_url=os.getenv("S3_ENDPOINT_URL"),
+        # Enough pooled connections for concurrent parts and batch uploads
+        config=Config(max_pool_connections=max(MAX_CONCURRENCY * 2, 10)),
+    )
+
+
+def transfer_config(multipart_threshold=MULTIPART_THRESHOLD, multipart_chunksize=MULTIPART_CHUNKSIZE,
+                    max_concurrency=MAX_CONCURRENCY):
+    """Returns the TransferConfig used for uploads."""
+    return TransferConfig(
+        multipart_threshold=multipart_threshold,
+        multipart_chunksize=multipart_chunksize,
+        max_concurrency=max_concurrency,
+    )
+
+
+def _state_path(file_name, bucket_name, object_name):
+    key = f"{os.path.abspath(file_name)}|{bucket_name}|{object_name}"
+    return os.path.join(UPLOAD_STATE_DIR, hashlib.sha256(key.encode()).hexdigest() + ".json")
+
+
+def _uploaded_parts(s3_client, bucket_name, object_name, upload_id):
+    """Returns {part number: ETag} for the parts S3 already has."""
+    parts = {}
+    paginator = s3_client.get_paginator("list_parts")
+    for page in paginator.paginate(Bucket=bucket_name, Key=object_name, UploadId=upload_id):
+        for part in page.get("Parts", []):
+            parts[part["PartNumber"]] = part["ETag"]
+    return parts
+
+
+def _abort_upload(s3_client, bucket_name, object_name, upload_id):
+    """Aborts a multipart upload, so its parts stop taking up (billed) storage."""
+    try:
+        s3_client.abort_multipart_upload(Bucket=bucket_name, Key=object_name, UploadId=upload_id)
+    except ClientError as e:
+        # Already completed or aborted
+        if e.response.get("Error", {}).get("Code") != "NoSuchUpload":
+            raise
+
+
+def resumable_upload(file_name, bucket_name, object_name, config=None):
+    """Uploads a file in parts, resuming an earlier interrupted upload.
+
+    The multipart UploadId is recorded under UPLOAD_STATE_DIR before any part
+    is sent. If the process dies, the next call for the same file, bucket and
+    key asks S3 which parts arrived and only sends the rest. A recorded upload
+    is aborted and started over if the file's size or mtime changed since.
+    """
+    config = config or transfer_config()
+    s3_client = get_s3_client()
+    stat = os.stat(file_name)
+    chunksize = config.multipart_chunksize
+    part_count = max(1, math.ceil(stat.st_size / chunksize))
+
+    state_path = _state_path(file_name, bucket_name, object_name)
+    state = {}
+    if os.path.exists(state_path):
+        with open(state_path) as f:
+            state = json.load(f)
+    if state and (state.get("size") != stat.st_size or state.get("mtime") != stat.st_mtime
+                  or state.get("chunksize") != chunksize):
+        _abort_upload(s3_client, bucket_name, object_name, state["upload_id"])
+        state = {}
+
+    done = {}
+    if state:
+        try:
+            done = _uploaded_parts(s3_client, bucket_name, object_name, state["upload_id"])
+            print(f"Resuming upload of {file_name}: {len(done)}/{part_count} parts already sent")
+        except ClientError:
+            # The upload was completed or aborted in the meantime, or can't be resumed
+            _abort_upload(s3_client, bucket_name, object_name, state["upload_id"])
+            state = {}
+    if not state:
+        upload_id = s3_client.create_multipart_upload(Bucket=bucket_name, Key=object_name)["UploadId"]
+        state = {"upload_id": upload_id, "size": stat.st_size, "mtime": stat.st_mtime, "chunksize": chunksize}
+        os.makedirs(UPLOAD_STATE_DIR, exist_ok=True)
+        with open(state_path, "w") as f:
+            json.dump(state, f)
+
+    def send(part_number):
+        with open(file_name, "rb") as f:
+            f.seek((part_number - 1) * chunksize)
+            body = f.read(chunksize)
+        response = s3_client.upload_part(
+            Bucket=bucket_name, Key=object_name, UploadId=state["upload_id"],
+            PartNumber=part_number, Body=body,
+        )
+        return part_number, response["ETag"]
+
+    missing = [n for n in range(1, part_count + 1) if n not in done]
+    with ThreadPoolExecutor(max_workers=config.max_concurrency) as pool:
+        done.update(pool.map(send, missing))
+
+    s3_client.complete_multipart_upload(
+        Bucket=bucket_name, Key=object_name, UploadId=state["upload_id"],
+        MultipartUpload={"Parts": [{"PartNumber": n, "ETag": done[n]} for n in sorted(done)]},
+    )
+    os.remove(state_path)
+
+
+def remote_etag(bucket_name, object_name):
+    """Returns the ETag of an S3 object, or None if it does not exist."""
+    try:
+        return get_s3_client().head_object(Bucket=bucket_name, Key=object_name)["ETag"]
+    except ClientError as e:
+        if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+            return None
+        raise
+
+
+def upload_file_to_s3(file_name, bucket_name=None, object_name=None, config=None, use_ledger=True):
     """Upload a file to an S3 bucket using .env config
 
+    Files at or above the multipart threshold are sent in parallel parts and
+    resume from the last uploaded part if an earlier upload was interrupted.
+    With use_ledger, the upload is skipped when the upload ledger shows this
+    exact content was already sent to the same key and the object's ETag has
+    not changed since.
+
     :param file_name: File to upload
-    :param bucket: Bucket to upload to
+    :param bucket_name: Bucket to upload to. If not specified, S3_BUCKET_NAME is used
     :param object_name: S3 object name. If not specified, file_name is used
-    :return: True if file was uploaded, else False
+    :param config: TransferConfig; transfer_config() by default
+    :param use_ledger: Skip unchanged files and record uploads in the ledger
+    :return: True if file was uploaded (or already up to date), else False
     """
 
-    bucket_name = os.getenv("S3_BUCKET_NAME")
+    bucket_name = bucket_name or os.getenv("S3_BUCKET_NAME")
     if bucket_name is None:
         raise ValueError("S3_BUCKET_NAME not set in environment variables")
 
@@ -18,17 +168,41 @@ def upload_file_to_s3(file_name, bucket_name, object_name=None):
     if object_name is None:
         object_name = file_name
 
+    config = config or transfer_config()
+
+    target = f"s3://{bucket_name}/{object_name}"
+    ledger = default_ledger() if use_ledger else None
+
     # Upload the file
-    s3_client = boto3.client(
-        's3',
-        aws_access_key_id=os.getenv("AWS_ACCESS_KEY_ID"),
-        aws_secret_access_key=os.getenv("AWS_SECRET_ACCESS_KEY"),
-        region_name=os.getenv("AWS_DEFAULT_REGION")
-    )
     try:
-        s3_client.upload_file(file_name, bucket_name, object_name)
+        recorded = ledger.lookup(target, file_name) if ledger else None
+        if recorded and remote_etag(bucket_name, object_name) == recorded["remote_etag"]:
+            print(f"Skipped {file_name}: {bucket_name}/{object_name} is unchanged")
+            return True
+
+        file_fingerprint = fingerprint(file_name)
+        if os.path.getsize(file_name) >= config.multipart_threshold:
+            resumable_upload(file_name, bucket_name, object_name, config)
+        else:
+            get_s3_client().upload_file(file_name, bucket_name, object_name, Config=config)
+        if ledger:
+            ledger.record(target, file_fingerprint, remote_etag(bucket_name, object_name))
         print(f"Uploaded {file_name} to {bucket_name}/{object_name}")
     except Exception as e:
         print(f"Error uploading {file_name} to {bucket_name}/{object_name}: {e}")
         return False
-    return True
\ No newline at end of file
+    return True
+
+
+def upload_files_to_s3(files, bucket_name=None, max_workers=4, config=None, use_ledger=True):
+    """Uploads several files concurrently
+
+    :param files: {file_name: object_name}; object_name may be None
+    :return: {file_name: True if uploaded, else False}
+    """
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        futures = {
+            file_name: pool.submit(upload_file_to_s3, file_name, bucket_name, object_name, config, use_ledger)
+            for file_name, object_name in files.items()
+        }
+    return {file_name: future.result() for file_name, future in futures.items()}
@@ -0,0 +1,102 @@
+import contextlib
+import functools
+import json
+import os
+import threading
+import time
+from manifest import is_unchanged
+
+try:
+    import fcntl
+except ImportError:
+    # Windows: updates are only serialized between threads
+    fcntl = None
+
+# Local record of what was last uploaded where, so unchanged artifacts are not
+# re-sent to S3 or Azure. Each target ("s3://bucket/key", "azure://container/blob")
+# maps to the content hash, size and mtime of the uploaded file and the remote
+# ETag the upload produced.
+#
+# Concurrent DAG tasks and the dashboard update the same file, so each update
+# holds an flock on a sidecar <ledger>.lock file while it reads and replaces it.
+
+LEDGER_PATH = os.getenv("UPLOAD_LEDGER_PATH", "output/upload_ledger.json")
+
+
+class UploadLedger:
+    def __init__(self, path=LEDGER_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def lookup(self, target, file_name):
+        """Returns the entry for target if file_name is unchanged since it was uploaded there."""
+        with self._locked():
+            entry = self._read().get(target)
+        if not entry or not is_unchanged(file_name, entry):
+            return None
+        # Same content with a new mtime: remember it so the next check skips hashing
+        mtime = os.stat(file_name).st_mtime
+        if mtime != entry["mtime"]:
+            entry = dict(entry, mtime=mtime)
+            self._update(target, entry)
+        return entry
+
+    def record(self, target, file_fingerprint, remote_etag):
+        """Records that the file described by file_fingerprint now lives at target."""
+        self._update(target, dict(file_fingerprint, remote_etag=remote_etag, uploaded_at=time.time()))
+
+    def forget(self, target):
+        self._update(target, None)
+
+    @contextlib.contextmanager
+    def _locked(self):
+        """Excludes other threads, and other processes using the same ledger file."""
+        with self._lock:
+            if fcntl is None:
+                yield
+                return
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with open(self.path + ".lock", "a") as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _read(self):
+        if not os.path.exists(self.path):
+            return {}
+        with open(self.path) as f:
+            return json.load(f)
+
+    def _update(self, target, entry):
+        """Applies one change to the ledger as it is on disk now.
+
+        Re-reading under the lock keeps the entries other processes (a
+        concurrent DAG task, the dashboard) saved since this one last looked.
+        """
+        with self._locked():
+            entries = self._read()
+            if entry is not None:
+                entries[target] = entry
+            elif entries.pop(target, None) is None:
+                return
+            self._save(entries)
+
+    def _save(self, entries):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{self.path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(entries, f, indent=2)
+        os.replace(tmp_path, self.path)
+
+
+@functools.lru_cache(maxsize=None)
+def default_ledger():
+    """Returns the process-wide ledger at LEDGER_PATH."""
+    return UploadLedger()
+
@@ -0,0 +1,143 @@
+import numpy as np
+import pandas as pd
+
+# Per-dimension pass rates and final grade distributions, shared by the PNG
+# renderer and the dashboard
+
+# Dimensions plotted as "Pass Rate by X"
+PASS_RATE_DIMENSIONS = ["subject", "studytime", "famsize", "internet", "romantic", "age", "address", "sex"]
+# Dimensions plotted as G3 box plots in the dashboard
+BOX_DIMENSIONS = ["sex", "failures", "studytime", "absences", "Medu", "Pstatus"]
+DIMENSIONS = list(dict.fromkeys(PASS_RATE_DIMENSIONS + BOX_DIMENSIONS))
+
+QUANTILES = {"q1": 0.25, "median": 0.5, "q3": 0.75}
+
+
+def _rank_values(hist, values, ranks):
+    """Returns the value at the given 0-based rank of each histogram row."""
+    cumulative = hist.cumsum(axis=1)
+    positions = (cumulative <= ranks[:, None]).sum(axis=1)
+    return values[np.minimum(positions, len(values) - 1)]
+
+
+def _quantile(hist, values, counts, q):
+    """Linear-interpolated quantile of each histogram row, as np.percentile computes it."""
+    position = q * (counts - 1)
+    low = np.floor(position)
+    fraction = position - low
+    low_value = _rank_values(hist, values, low)
+    high_value = _rank_values(hist, values, np.ceil(position))
+    return low_value + (high_value - low_value) * fraction
+
+
+def compute_aggregates(df, dimensions=DIMENSIONS, target="G3"):
+    """Computes pass rates and target distributions for every dimension.
+
+    The target is coded once; each dimension then takes two bincount calls
+    over its group x target value codes instead of a groupby scan, and only
+    one dimension's codes are held at a time, so memory stays O(rows).
+    Quantiles and box plot whiskers are then derived from the small
+    per-group histograms.
+
+    :return: {dimension: DataFrame indexed by the observed values, sorted, with
+        count, pass_count, pass_rate, min, q1, median, q3, max, whislo, whishi
+        and fliers (target values beyond the 1.5 IQR whiskers)}
+    """
+    target_values, target_codes = np.unique(df[target].to_numpy(), return_inverse=True)
+    target_values = target_values.astype(float)
+    n_values = max(len(target_values), 1)
+    passed = df["pass"].to_numpy(dtype=np.float64)
+
+    hists, pass_counts, labels = [], [], []
+    for dim in dimensions:
+        codes, uniques = pd.factorize(df[dim], sort=True)
+        valid = codes >= 0
+        if valid.all():
+            keys, weights = codes * n_values + target_codes, passed
+        else:
+            keys, weights = codes[valid] * n_values + target_codes[valid], passed[valid]
+        groups = len(uniques)
+        hists.append(np.bincount(keys, minlength=groups * n_values).reshape(groups, n_values))
+        pass_counts.append(np.bincount(keys // n_values, weights=weights, minlength=groups))
+        labels.append(uniques)
+
+    hist = np.vstack(hists) if hists else np.empty((0, n_values), dtype=np.int64)
+    pass_count = np.concatenate(pass_counts) if pass_counts else np.empty(0)
+    return _summarize(hist, pass_count, target_values, labels, dimensions)
+
+
+def aggregates_from_counts(grouped, dimensions=DIMENSIONS, target="G3"):
+    """Same result as compute_aggregates, built from pre-grouped counts.
+
+    Lets a database answer the heavy part: only one row per (dimension value,
+    target value) is needed, however many rows the data has.
+
+    :param grouped: {dimension: DataFrame with columns dimension, target,
+        count and pass_count}, e.g. from GROUP BY dimension, target
+    """
+    frames = [grouped[dim] for dim in dimensions]
+    target_values = np.unique(np.concatenate([f[target].to_numpy(dtype=float) for f in frames] or [np.empty(0)]))
+
+    hists, pass_counts, labels = [], [], []
+    for dim, frame in zip(dimensions, frames):
+        frame = frame.dropna(subset=[dim])
+        codes, uniques = pd.factorize(frame[dim], sort=True)
+        hist = np.zeros((len(uniques), len(target_values)), dtype=np.int64)
+        np.add.at(hist, (codes, np.searchsorted(target_values, frame[target].to_numpy(dtype=float))),
+                  frame["count"].to_numpy(dtype=np.int64))
+        hists.append(hist)
+        pass_counts.append(np.bincount(codes, weights=frame["pass_count"].to_numpy(dtype=float),
+                                       minlength=len(uniques)))
+        labels.append(uniques)
+
+    hist = np.vstack(hists) if hists else np.empty((0, len(target_values)), dtype=np.int64)
+    pass_count = np.concatenate(pass_counts) if pass_counts else np.empty(0)
+    return _summarize(hist, pass_count, target_values, labels, dimensions)
+
+
+def _summarize(hist, pass_count, target_values, labels, dimensions):
+    """Derives the per-group statistics from the group x target value histogram."""
+    groups = len(hist)
+    count = hist.sum(axis=1)
+
+    stats = {"count": count, "pass_count": pass_count, "pass_rate": pass_count / np.maximum(count, 1)}
+    if groups and len(target_values):
+        observed = hist > 0
+        stats["min"] = target_values[observed.argmax(axis=1)]
+        stats["max"] = target_values[len(target_values) - 1 - observed[:, ::-1].argmax(axis=1)]
+        for name, q in QUANTILES.items():
+            stats[name] = _quantile(hist, target_values, count, q)
+
+        # Box plot whiskers reach the furthest values within 1.5 IQR of the box
+        iqr = stats["q3"] - stats["q1"]
+        inside = observed & (target_values >= (stats["q1"] - 1.5 * iqr)[:, None]) \
+            & (target_values <= (stats["q3"] + 1.5 * iqr)[:, None])
+        stats["whislo"] = target_values[inside.argmax(axis=1)]
+        stats["whishi"] = target_values[len(target_values) - 1 - inside[:, ::-1].argmax(axis=1)]
+        outside = observed & ~inside
+        stats["fliers"] = [target_values[row].tolist() for row in outside]
+
+    aggregates = {}
+    offset = 0
+    for dim, uniques in zip(dimensions, labels):
+        block = slice(offset, offset + len(uniques))
+        offset += len(uniques)
+        index = pd.Index(uniques, name=dim)
+        aggregates[dim] = pd.DataFrame({name: values[block] for name, values in stats.items()}, index=index)
+    return aggregates
+
+
+def box_stats(table):
+    """Converts an aggregate table into the stats list matplotlib's Axes.bxp draws."""
+    return [
+        {
+            "label": str(value),
+            "med": row["median"],
+            "q1": row["q1"],
+            "q3": row["q3"],
+            "whislo": row["whislo"],
+            "whishi": row["whishi"],
+            "fliers": row["fliers"],
+        }
+        for value, row in table.iterrows()
+    ]
@@ -0,0 +1,47 @@
+import contextlib
+import io
+import os
+import zipfile
+
+# Reads files straight out of (nested) ZIP archives, so the raw CSVs don't have
+# to be extracted to disk before they are transformed
+
+
+def walk_zip(archive):
+    """Yields (zip file, member) for every file in archive and the ZIPs nested in it.
+
+    Nested ZIPs are opened from memory, never written to disk.
+    """
+    for member in archive.infolist():
+        if member.is_dir():
+            continue
+        if member.filename.endswith(".zip"):
+            with zipfile.ZipFile(io.BytesIO(archive.read(member))) as nested_zip:
+                yield from walk_zip(nested_zip)
+        else:
+            yield archive, member
+
+
+def member_info(archive_path):
+    """Returns {file name: {"crc", "size"}} for the files in an archive.
+
+    Files are keyed by base name; the CRC and size from the ZIP directory
+    identify a member's content without decompressing it.
+    """
+    with zipfile.ZipFile(archive_path) as archive:
+        return {
+            os.path.basename(member.filename): {"crc": member.CRC, "size": member.file_size}
+            for _, member in walk_zip(archive)
+        }
+
+
+@contextlib.contextmanager
+def open_member(archive_path, name):
+    """Opens the file called name inside the archive as a binary stream."""
+    with zipfile.ZipFile(archive_path) as archive:
+        for owner, member in walk_zip(archive):
+            if os.path.basename(member.filename) == name:
+                with owner.open(member) as f:
+                    yield f
+                return
+    raise FileNotFoundError(f"{name} not found in {archive_path}")
@@ -0,0 +1,175 @@
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import subprocess
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+import metrics
+from synthetic import generate
+
+# Times each pipeline stage on synthetic data and appends the results to a
+# JSON history, so runs can be compared over time
+#
+#   python scripts/benchmark.py --rows 100000
+#   python scripts/benchmark.py --rows 1000000 --stages transform load_sqlite
+#
+# Every stage runs in a fresh process, so its peak RSS is its own. Memory
+# of worker processes the stage starts (e.g. the render pool) isn't included.
+
+HISTORY_PATH = "benchmarks/history.json"
+STAGES = ["extract", "transform", "load_sqlite", "visualize", "fit"]
+# The RandomForest fit is timed on at most this many rows
+FIT_MAX_ROWS = 1_000_000
+
+
+def stage_extract(workdir, options):
+    """Extracts the raw CSVs from the nested synthetic archive."""
+    from extract import extract_nested_zip
+    extract_nested_zip(os.path.join(workdir, "data", "student.zip"), os.path.join(workdir, "extracted"))
+    return 2 * options["rows"]
+
+
+def stage_transform(workdir, options):
+    from transform import load_and_transform
+    load_and_transform(os.path.join(workdir, "data"), os.path.join(workdir, "output"),
+                       chunksize=options["chunksize"], force=True)
+    return 2 * options["rows"]
+
+
+def stage_load_sqlite(workdir, options):
+    from load import load_to_sqlite
+    db_path = os.path.join(workdir, "students.db")
+    for path in (db_path, db_path + "-wal", db_path + "-shm"):
+        if os.path.exists(path):
+            os.remove(path)
+    load_to_sqlite(os.path.join(workdir, "output", "transformed_students.csv"), db_path)
+    return 2 * options["rows"]
+
+
+def stage_visualize(workdir, options):
+    from render import render_plots
+    render_plots(os.path.join(workdir, "output", "transformed_students.csv"),
+                 os.path.join(workdir, "plots"), force=True)
+    return 2 * options["rows"]
+
+
+def stage_fit(workdir, options):
+    from dataset import read_transformed
+    from model import train_model
+    df = read_transformed(os.path.join(workdir, "output", "transformed_students.csv"))
+    if len(df) > options["fit_max_rows"]:
+        df = df.sample(options["fit_max_rows"], random_state=42)
+    train_model(df)
+    return len(df)
+
+
+def _run_stage(name, workdir, options):
+    """Runs one stage and returns its rows, wall time and peak RSS."""
+    # A spawned process starts with its parent's ru_maxrss, so the high-water
+    # mark is reset to this process's own RSS first
+    metrics.reset_peak_rss()
+    start = time.perf_counter()
+    rows = globals()[f"stage_{name}"](workdir, options)
+    seconds = time.perf_counter() - start
+    return {
+        "rows": rows,
+        "seconds": round(seconds, 3),
+        "peak_rss_mb": metrics.peak_rss_mb(),
+        "rows_per_sec": round(rows / seconds) if seconds else None,
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def load_history(path=HISTORY_PATH):
+    if not os.path.exists(path):
+        return []
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_history(history, path=HISTORY_PATH):
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(history, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def previous_run(history, rows):
+    """Returns the latest recorded run at the same size, to compare against."""
+    for run in reversed(history):
+        if run["rows_per_subject"] == rows:
+            return run
+    return None
+
+
+def run_benchmark(rows=100_000, stages=None, workdir="benchmarks/work", history_path=HISTORY_PATH,
+                  chunksize=None, fit_max_rows=FIT_MAX_ROWS, seed=0):
+    """Generates rows synthetic records per subject and times each stage on them.
+
+    :return: The run as recorded in the history
+    """
+    stages = stages or STAGES
+    # A fresh spawned process for the generator and for each stage, so this
+    # process stays small and peak RSS isn't inherited from earlier stages
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+        pool.submit(generate, rows, os.path.join(workdir, "data"), seed=seed, archive=True).result()
+    options = {"rows": rows, "chunksize": chunksize, "fit_max_rows": fit_max_rows}
+
+    history = load_history(history_path)
+    previous = previous_run(history, rows)
+    results = {}
+    for name in STAGES:
+        if name not in stages:
+            continue
+        with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+            results[name] = pool.submit(_run_stage, name, workdir, options).result()
+        line = (f"{name:<12} {results[name]['seconds']:>9.2f}s {results[name]['peak_rss_mb']:>9.1f} MB "
+                f"{results[name]['rows_per_sec'] or 0:>12,} rows/s")
+        if previous and name in previous["stages"]:
+            before = previous["stages"][name]["seconds"]
+            line += f"  ({(results[name]['seconds'] - before) / before:+.0%} vs {previous['commit'] or 'previous run'})"
+        print(line)
+
+    run = {
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "commit": git_commit(),
+        "rows_per_subject": rows,
+        "python": platform.python_version(),
+        "cpus": os.cpu_count(),
+        "stages": results,
+    }
+    history.append(run)
+    save_history(history, history_path)
+    print(f"Results appended to: {history_path}")
+    return run
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the pipeline stages on synthetic data")
+    parser.add_argument("--rows", type=int, default=100_000, help="rows per subject file (10^4 - 10^7)")
+    parser.add_argument("--stages", nargs="+", choices=STAGES, default=STAGES)
+    parser.add_argument("--workdir", default="benchmarks/work")
+    parser.add_argument("--history", default=HISTORY_PATH)
+    parser.add_argument("--chunksize", type=int, default=None, help="stream the transform in chunks")
+    parser.add_argument("--fit-max-rows", type=int, default=FIT_MAX_ROWS)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    run_benchmark(args.rows, args.stages, args.workdir, args.history, args.chunksize, args.fit_max_rows, args.seed)
+
+
+if __name__ == "__main__":
+    main()
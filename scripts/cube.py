@@ -0,0 +1,141 @@
+import os
+import numpy as np
+import pandas as pd
+from aggregates import DIMENSIONS, aggregates_from_counts
+from dataset import CATEGORIES, SMALL_INT_COLUMNS, YES_NO_COLUMNS
+
+# Pre-aggregated summary cube written by the transform alongside the row-level
+# output. It holds the row count, pass count and G3 histogram of every group
+# of the GROUPINGS, so per-dimension charts are answered from a few thousand
+# cube rows instead of a pass over the dataset.
+#
+# The cube is one long table: a "grouping" column names the dimensions a row
+# is grouped by (e.g. "sex,age,failures"), the columns of dimensions outside
+# that grouping are empty.
+
+TARGET = "G3"
+# Dashboard filters; every dimension is also crossed with them, so filtered
+# aggregates come from the cube too
+FILTER_COLUMNS = ("sex", "age")
+GROUPINGS = (
+    [(dim,) for dim in DIMENSIONS]
+    + [FILTER_COLUMNS]
+    + [FILTER_COLUMNS + (dim,) for dim in DIMENSIONS if dim not in FILTER_COLUMNS]
+)
+COUNT_COLUMNS = ["count", "pass_count"]
+
+
+def cube_path_for(csv_path):
+    """Returns the summary cube written alongside a transformed (or partition) CSV."""
+    return os.path.splitext(csv_path)[0] + ".cube.parquet"
+
+
+def _with_dtypes(cube):
+    """Gives every dimension a nullable dtype, since it is empty outside its groupings."""
+    dtypes = {col: pd.CategoricalDtype(values) for col, values in CATEGORIES.items()}
+    dtypes.update({col: pd.CategoricalDtype(["no", "yes"]) for col in YES_NO_COLUMNS})
+    dtypes.update({col: "Int8" for col in SMALL_INT_COLUMNS})
+    dtypes["subject"] = "category"
+    dtypes.update(grouping="category", count="int64", pass_count="int64")
+    columns = ["grouping", *DIMENSIONS, TARGET, *COUNT_COLUMNS]
+    return cube.reindex(columns=columns).astype({col: dtypes[col] for col in columns})
+
+
+def build_cube(df):
+    """Counts the rows and passes per target value for every grouping of df.
+
+    Every column is factorized once; each grouping is then one bincount over
+    the combined codes of its columns rather than a groupby.
+
+    :param df: Typed transformed rows (dataset.apply_dtypes)
+    """
+    codes, labels, missing = {}, {}, {}
+    for col in [*DIMENSIONS, TARGET]:
+        codes[col], uniques = pd.factorize(df[col], sort=True)
+        labels[col] = np.asarray(uniques)
+        missing[col] = bool((codes[col] < 0).any())
+    passed = df["pass"].to_numpy(dtype=np.float64)
+
+    frames = []
+    for grouping in GROUPINGS:
+        columns = [*grouping, TARGET]
+        shape = tuple(max(len(labels[col]), 1) for col in columns)
+        key = np.ravel_multi_index([codes[col] for col in columns], shape, mode="clip")
+        weights = passed
+        if any(missing[col] for col in columns):
+            # Rows missing a value of the grouping are left out, as groupby would
+            valid = np.logical_and.reduce([codes[col] >= 0 for col in columns])
+            key, weights = key[valid], passed[valid]
+        count = np.bincount(key, minlength=int(np.prod(shape)))
+        pass_count = np.bincount(key, weights=weights, minlength=len(count))
+        present = np.flatnonzero(count)
+        positions = np.unravel_index(present, shape)
+        frame = pd.DataFrame({col: labels[col][pos] for col, pos in zip(columns, positions)})
+        frames.append(frame.assign(count=count[present], pass_count=pass_count[present].astype(np.int64),
+                                   grouping=",".join(grouping)))
+    return _with_dtypes(pd.concat(frames, ignore_index=True))
+
+
+def merge_cubes(cubes):
+    """Adds up cubes of disjoint sets of rows, e.g. of chunks or partitions."""
+    cube = pd.concat([_with_dtypes(cube) for cube in cubes], ignore_index=True)
+    keys = ["grouping", *DIMENSIONS, TARGET]
+    merged = cube.groupby(keys, observed=True, dropna=False)[COUNT_COLUMNS].sum().reset_index()
+    return _with_dtypes(merged)
+
+
+def write_cube(cube, path):
+    """Replaces the cube at path atomically, so readers never see a partial file."""
+    tmp_path = path + ".tmp"
+    cube.to_parquet(tmp_path, index=False)
+    os.replace(tmp_path, path)
+
+
+def read_cube(path):
+    return _with_dtypes(pd.read_parquet(path))
+
+
+def cube_is_current(csv_path):
+    """True when the cube was written after the transformed CSV it summarizes."""
+    path = cube_path_for(csv_path)
+    if not (os.path.exists(path) and os.path.exists(csv_path)):
+        return False
+    return os.stat(path).st_mtime_ns >= os.stat(csv_path).st_mtime_ns
+
+
+def find_grouping(columns):
+    """Returns the smallest grouping that contains all of columns, or None."""
+    candidates = [grouping for grouping in GROUPINGS if set(columns) <= set(grouping)]
+    return min(candidates, key=len) if candidates else None
+
+
+def cube_counts(cube, dims, equals=None, low=None, high=None, range_column="age"):
+    """Returns count and pass_count per (dims, target value) of the filtered rows.
+
+    :param equals: {column: value} equality filters
+    :param low: Inclusive lower bound on range_column
+    :param high: Inclusive upper bound on range_column
+    """
+    equals = equals or {}
+    filtered = list(equals) + ([range_column] if low is not None or high is not None else [])
+    grouping = find_grouping([*dims, *filtered])
+    if grouping is None:
+        raise KeyError(f"No cube grouping covers {[*dims, *filtered]}")
+
+    rows = cube[cube["grouping"] == ",".join(grouping)]
+    for col, value in equals.items():
+        rows = rows[rows[col] == value]
+    if low is not None:
+        rows = rows[rows[range_column] >= low]
+    if high is not None:
+        rows = rows[rows[range_column] <= high]
+
+    counts = rows.groupby([*dims, TARGET], observed=True)[COUNT_COLUMNS].sum().reset_index()
+    # Dimensions are never empty within their grouping
+    return counts.astype({col: "int8" for col in [*dims, TARGET] if col in SMALL_INT_COLUMNS})
+
+
+def cube_aggregates(cube, dimensions=DIMENSIONS, equals=None, low=None, high=None):
+    """Same result as compute_aggregates on the filtered rows, answered from the cube."""
+    grouped = {dim: cube_counts(cube, [dim], equals, low, high) for dim in dimensions}
+    return aggregates_from_counts(grouped, dimensions, TARGET)
@@ -0,0 +1,266 @@
+import pandas as pd
+from pandas.api.types import is_integer_dtype
+import pyarrow as pa
+import pyarrow.parquet as pq
+import os
+
+# Explicit dtypes for the transformed dataset, so consumers don't have to
+# re-infer them from CSV text on every read
+
+# Low-cardinality text fields and their allowed values
+CATEGORIES = {
+    "sex": ["F", "M"],
+    "address": ["R", "U"],
+    "famsize": ["GT3", "LE3"],
+    "Pstatus": ["A", "T"],
+    "Mjob": ["at_home", "health", "other", "services", "teacher"],
+    "Fjob": ["at_home", "health", "other", "services", "teacher"],
+    "reason": ["course", "home", "other", "reputation"],
+}
+
+# yes/no flags
+YES_NO_COLUMNS = [
+    "schoolsup", "famsup", "paid", "activities",
+    "nursery", "higher", "internet", "romantic",
+]
+
+# Ages, 1-5 ordinal scores, counts and 0-20 grades all fit in int8
+SMALL_INT_COLUMNS = [
+    "age", "Medu", "Fedu", "traveltime", "studytime", "failures",
+    "famrel", "freetime", "goout", "Dalc", "Walc", "health",
+    "absences", "G1", "G2", "G3",
+]
+
+# Schema of a raw student record, as documented for the UCI dataset. Raw rows
+# are checked against it by validate_raw before they are transformed.
+
+# Allowed range of every numeric field
+RANGES = {
+    "age": (15, 22),
+    "Medu": (0, 4), "Fedu": (0, 4),
+    "traveltime": (1, 4), "studytime": (1, 4), "failures": (0, 4),
+    "famrel": (1, 5), "freetime": (1, 5), "goout": (1, 5),
+    "Dalc": (1, 5), "Walc": (1, 5), "health": (1, 5),
+    "absences": (0, 93),
+    "G1": (0, 20), "G2": (0, 20), "G3": (0, 20),
+}
+
+# Allowed values of every text field, including those the transform drops
+RAW_CATEGORIES = dict(
+    CATEGORIES,
+    school=["GP", "MS"],
+    guardian=["father", "mother", "other"],
+    **{col: ["no", "yes"] for col in YES_NO_COLUMNS},
+)
+
+# dtypes to read raw files with: text fields are parsed straight into categoricals
+RAW_DTYPES = {col: "category" for col in RAW_CATEGORIES}
+
+# Column added to rejected rows, naming the fields that failed validation
+REJECT_REASON = "reject_reason"
+
+# Attributes the UCI dataset documents as identifying a student (school is
+# dropped by the transform), plus the subject the row belongs to
+KEY_COLUMNS = [
+    "sex", "age", "address", "famsize", "Pstatus", "Medu", "Fedu",
+    "Mjob", "Fjob", "reason", "nursery", "internet", "subject",
+]
+
+
+def column_kind(col):
+    """Returns the storage kind of a transformed column: text, smallint, float or bool."""
+    if col in SMALL_INT_COLUMNS:
+        return "smallint"
+    if col == "pass":
+        return "bool"
+    if col == "G_avg":
+        return "float"
+    return "text"
+
+
+def parquet_path_for(csv_path):
+    """Returns the columnar file written alongside a transformed CSV."""
+    return os.path.splitext(csv_path)[0] + ".parquet"
+
+
+def arrow_path_for(csv_path):
+    """Returns the memory-mappable Arrow IPC file written alongside a transformed CSV."""
+    return os.path.splitext(csv_path)[0] + ".arrow"
+
+
+def transformed_file(csv_path):
+    """Returns the file read_transformed will actually load."""
+    for path in (arrow_path_for(csv_path), parquet_path_for(csv_path)):
+        if os.path.exists(path):
+            return path
+    return csv_path
+
+
+def apply_dtypes(df):
+    """Converts a transformed frame to its compact, explicit dtypes."""
+    dtypes = {col: pd.CategoricalDtype(values) for col, values in CATEGORIES.items()}
+    dtypes.update({col: pd.CategoricalDtype(["no", "yes"]) for col in YES_NO_COLUMNS})
+    dtypes.update({col: "int8" for col in SMALL_INT_COLUMNS})
+    dtypes["subject"] = "category"
+    dtypes["pass"] = "bool"
+    return df.astype({col: dtype for col, dtype in dtypes.items() if col in df.columns})
+
+
+def validate_raw(df):
+    """Checks raw student records against the schema and coerces their types.
+
+    Numeric fields are parsed (the raw files quote some grades, e.g. "5"),
+    and must be whole numbers within RANGES; text fields must be one of
+    RAW_CATEGORIES. Every check is a column-wide operation.
+
+    :return: (valid rows with compact int8 / categorical columns,
+              rejected rows as read plus a REJECT_REASON column)
+    """
+    missing = [col for col in [*RANGES, *RAW_CATEGORIES] if col not in df.columns]
+    if missing:
+        raise ValueError(f"Raw student records are missing columns: {', '.join(missing)}")
+
+    coerced = {}
+    invalid = {}
+    for col, (low, high) in RANGES.items():
+        values = df[col]
+        valid_values = values.between(low, high) if is_integer_dtype(values) else None
+        if valid_values is None:
+            values = pd.to_numeric(values, errors="coerce")
+            valid_values = values.between(low, high) & (values % 1 == 0)
+        invalid[col] = ~valid_values
+        coerced[col] = values
+    for col, allowed in RAW_CATEGORIES.items():
+        # Values outside the categories become NaN. Columns read with RAW_DTYPES
+        # are already categorical, so this only relabels their categories.
+        values = df[col].astype("category").cat.set_categories(allowed)
+        invalid[col] = values.isna()
+        coerced[col] = values
+    invalid = pd.DataFrame(invalid, index=df.index)
+    rejected_mask = invalid.any(axis=1).to_numpy()
+
+    valid = df.assign(**coerced)
+    if not rejected_mask.any():
+        # The common case: nothing to filter out
+        rejected = df.iloc[:0].assign(**{REJECT_REASON: pd.Series(dtype=object)})
+        return valid.astype({col: "int8" for col in RANGES}), rejected
+
+    valid = valid[~rejected_mask].astype({col: "int8" for col in RANGES})
+    rejected = df[rejected_mask].copy()
+    failed = invalid[rejected_mask]
+    # Names of the failed fields, e.g. "age;G1"
+    rejected[REJECT_REASON] = failed.dot(failed.columns + ";").str.rstrip(";")
+    return valid, rejected
+
+
+def write_arrow(parquet_path, path):
+    """Converts a Parquet file into an uncompressed Arrow IPC file that read_arrow can map.
+
+    read_arrow can only share a column that is one contiguous array, so the
+    whole dataset is held in memory while the file is written. Columns are
+    read and made contiguous one at a time to keep that to a single copy of
+    the compact, typed data. The file is replaced atomically, so processes
+    that still map the old file keep reading it instead of faulting on a
+    truncated one.
+    """
+    parquet = pq.ParquetFile(parquet_path)
+    columns = []
+    for name in parquet.schema_arrow.names:
+        column = parquet.read(columns=[name]).unify_dictionaries().column(0)
+        columns.append(column.combine_chunks())
+    table = pa.Table.from_arrays(columns, schema=parquet.schema_arrow)
+    tmp_path = path + ".tmp"
+    with pa.OSFile(tmp_path, "wb") as sink, pa.ipc.new_file(sink, table.schema) as writer:
+        writer.write_table(table)
+    os.replace(tmp_path, path)
+
+
+def read_arrow(path):
+    """Memory-maps an Arrow IPC file as a read-only DataFrame.
+
+    Numeric columns and the codes of categorical columns are views of the
+    mapped file, not copies, so every process that opens it shares the same
+    pages of the OS page cache. Booleans (bit-packed in Arrow) and columns
+    with missing values are copied.
+    """
+    table = pa.ipc.open_file(pa.memory_map(path, "r")).read_all()
+    columns = {}
+    for name, column in zip(table.column_names, table.columns):
+        array = column.chunk(0) if column.num_chunks == 1 else column.combine_chunks()
+        if array.null_count:
+            columns[name] = column.to_pandas()
+        elif pa.types.is_dictionary(array.type):
+            dtype = pd.CategoricalDtype(array.dictionary.to_pylist(), ordered=array.type.ordered)
+            columns[name] = pd.Categorical.from_codes(array.indices.to_numpy(), dtype=dtype, validate=False)
+        elif pa.types.is_integer(array.type) or pa.types.is_floating(array.type):
+            columns[name] = array.to_numpy()
+        else:
+            columns[name] = column.to_pandas()
+    return pd.DataFrame(columns, copy=False)
+
+
+def read_transformed(csv_path="output/transformed_students.csv"):
+    """Loads the transformed dataset, preferring the memory-mapped Arrow file.
+
+    A frame read from the Arrow file shares its memory with the file, so
+    treat it as read-only.
+    """
+    arrow_path = arrow_path_for(csv_path)
+    if os.path.exists(arrow_path):
+        return read_arrow(arrow_path)
+    parquet_path = parquet_path_for(csv_path)
+    if os.path.exists(parquet_path):
+        return pd.read_parquet(parquet_path)
+    return apply_dtypes(pd.read_csv(csv_path))
+
+
+def read_transformed_chunks(csv_path="output/transformed_students.csv", chunksize=100_000):
+    """Yields the transformed dataset as typed frames of at most chunksize rows."""
+    arrow_path = arrow_path_for(csv_path)
+    if os.path.exists(arrow_path):
+        # Only the rows of each chunk are copied out of the mapped file
+        table = pa.ipc.open_file(pa.memory_map(arrow_path, "r")).read_all()
+        for offset in range(0, table.num_rows, chunksize):
+            yield table.slice(offset, chunksize).to_pandas()
+        return
+    parquet_path = parquet_path_for(csv_path)
+    if os.path.exists(parquet_path):
+        for batch in pq.ParquetFile(parquet_path).iter_batches(batch_size=chunksize):
+            yield batch.to_pandas()
+        return
+    with pd.read_csv(csv_path, chunksize=chunksize) as reader:
+        for chunk in reader:
+            yield apply_dtypes(chunk)
+
+
+def student_keys(df, seen):
+    """Returns the student_key of each row of a typed frame.
+
+    A key hashes KEY_COLUMNS and appends the occurrence number of that hash,
+    so students with identical key attributes still get distinct keys; seen
+    carries the occurrence counts across the chunks of one file.
+    """
+    base = pd.util.hash_pandas_object(df[KEY_COLUMNS], index=False).to_numpy()
+    keys = []
+    for value in base.tolist():
+        occurrence = seen.get(value, 0)
+        seen[value] = occurrence + 1
+        keys.append(f"{value:016x}-{occurrence}")
+    return keys
+
+
+def with_student_keys(df, seen):
+    """Adds student_key and row_hash columns in front of a typed frame.
+
+    student_key is described in student_keys. row_hash covers every column
+    and changes whenever the row does. G_avg is left out: it follows from
+    G1-G3, and its float text doesn't round-trip exactly through the CSV
+    fallback.
+    """
+    keys = student_keys(df, seen)
+    row_hash = pd.util.hash_pandas_object(df.drop(columns=["G_avg"], errors="ignore"), index=False).to_numpy()
+
+    df = df.copy()
+    df.insert(0, "row_hash", [f"{value:016x}" for value in row_hash.tolist()])
+    df.insert(0, "student_key", keys)
+    return df
@@ -0,0 +1,99 @@
+import os
+import threading
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
+from dotenv import load_dotenv
+load_dotenv()
+
+# Shared, pooled database engines for the loaders, the Airflow tasks and the
+# dashboard. One engine is created per database URL and reused for the life
+# of the process.
+#
+# Pool settings come from the environment:
+#   DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_RECYCLE (seconds), DB_POOL_PRE_PING
+# They only apply to server databases; embedded ones (SQLite, DuckDB) keep the
+# pool their dialect chooses.
+
+EMBEDDED_BACKENDS = ("sqlite", "duckdb")
+
+
+def _env_int(name, default):
+    return int(os.getenv(name, default))
+
+
+def pool_options():
+    """Returns the create_engine pool arguments from the environment."""
+    return {
+        "pool_size": _env_int("DB_POOL_SIZE", 5),
+        "max_overflow": _env_int("DB_MAX_OVERFLOW", 10),
+        "pool_recycle": _env_int("DB_POOL_RECYCLE", 1800),
+        "pool_pre_ping": os.getenv("DB_POOL_PRE_PING", "true").lower() in ("1", "true", "yes"),
+    }
+
+
+# Applied to every new SQLite connection
+SQLITE_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "busy_timeout": 30000,
+}
+
+_engines = {}
+_lock = threading.Lock()
+
+
+def get_engine(url=None):
+    """Returns the pooled engine for url (POSTGRES_URL by default)."""
+    url = url or os.getenv("POSTGRES_URL")
+    if not url:
+        raise ValueError("POSTGRES_URL not set in environment variables")
+    with _lock:
+        engine = _engines.get(url)
+        if engine is None:
+            backend = make_url(url).get_backend_name()
+            if backend == "sqlite":
+                engine = _create_sqlite_engine(url)
+            elif backend in EMBEDDED_BACKENDS:
+                engine = create_engine(url)
+            else:
+                engine = create_engine(url, **pool_options())
+            _engines[url] = engine
+        return engine
+
+
+def sqlite_engine(db_path):
+    """Returns the pooled engine for a SQLite database file."""
+    return get_engine(f"sqlite:///{os.path.abspath(db_path)}")
+
+
+def _create_sqlite_engine(url):
+    engine = create_engine(url, pool_pre_ping=pool_options()["pool_pre_ping"])
+
+    @event.listens_for(engine, "connect")
+    def set_pragmas(dbapi_connection, connection_record):
+        # The loaders manage transactions themselves with BEGIN/COMMIT
+        dbapi_connection.isolation_level = None
+        for name, value in SQLITE_PRAGMAS.items():
+            dbapi_connection.execute(f"PRAGMA {name}={value}")
+
+    return engine
+
+
+def dispose_engines():
+    """Closes every pooled connection, e.g. at the end of a batch job."""
+    with _lock:
+        for engine in _engines.values():
+            engine.dispose()
+        _engines.clear()
+
+
+def _reset_after_fork():
+    global _lock
+    # Pooled connections must not be shared with a forked child
+    _lock = threading.Lock()
+    for engine in _engines.values():
+        engine.dispose(close=False)
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
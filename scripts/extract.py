@@ -1,54 +1,186 @@
+import contextvars
+import functools
+import hashlib
+import io
 import os
+import threading
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urljoin
 import requests
 from bs4 import BeautifulSoup
-import zipfile
-import io
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+import metrics
+from archive import walk_zip
+from metrics import instrumented
+from manifest import load_manifest, save_manifest
 
-def extract_nested_zip(zip_bytes, extract_to):
-    """Extracts nested ZIP files if found inside a main ZIP."""
-    with zipfile.ZipFile(io.BytesIO(zip_bytes)) as outer_zip:
-        outer_zip.extractall(extract_to)
-        for file_name in outer_zip.namelist():
-            if file_name.endswith(".zip"):
-                nested_zip_path = os.path.join(extract_to, file_name)
-                print(f"Found nested zip: {nested_zip_path}")
-                with zipfile.ZipFile(nested_zip_path, 'r') as nested_zip:
-                    nested_zip.extractall(extract_to)
-                print(f"Extracted nested zip to {extract_to}")
-
-def extract_student_data(page_url, extract_dir="data"):
-    base_url = "https://archive.ics.uci.edu"
+# Downloaded archives are kept here with their ETag / Last-Modified headers so
+# unchanged archives are not downloaded again
+HTTP_CACHE_DIR = os.getenv("HTTP_CACHE_DIR", "data/.http_cache")
+HTTP_CACHE_INDEX = "index.json"
+EXTRACTED_INDEX = "extracted.json"
+# Downloads are streamed to disk in blocks of this size
+DOWNLOAD_BLOCK_SIZE = 1 << 20
+DOWNLOAD_TIMEOUT = int(os.getenv("DOWNLOAD_TIMEOUT", 60))
+DOWNLOAD_WORKERS = int(os.getenv("DOWNLOAD_WORKERS", 4))
 
-    # Step 1: Scrape the page for download links
-    response = requests.get(page_url)
+_index_lock = threading.Lock()
+
+
+@functools.lru_cache(maxsize=None)
+def get_session():
+    """Returns the shared requests.Session, with pooled connections and retries."""
+    session = requests.Session()
+    retries = Retry(total=3, backoff_factor=0.5, status_forcelist=(500, 502, 503, 504))
+    adapter = HTTPAdapter(pool_connections=DOWNLOAD_WORKERS, pool_maxsize=DOWNLOAD_WORKERS, max_retries=retries)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def download(url, cache_dir=HTTP_CACHE_DIR):
+    """Downloads url into cache_dir, unless the cached copy is still current.
+
+    The request carries If-None-Match / If-Modified-Since from the last
+    download; on 304 Not Modified the cached file is reused. The body is
+    streamed to a temporary file and moved into place once complete.
+
+    :return: (path of the cached file, True if it was downloaded, False if unchanged)
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    index = load_manifest(cache_dir, HTTP_CACHE_INDEX)
+    entry = index.get(url, {})
+    path = os.path.join(cache_dir, hashlib.sha256(url.encode()).hexdigest()[:16] + "-" + os.path.basename(url))
+
+    headers = {}
+    if os.path.exists(path):
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+
+    with get_session().get(url, headers=headers, stream=True, timeout=DOWNLOAD_TIMEOUT) as response:
+        if response.status_code == 304:
+            print(f"Not modified, using cached copy: {url}")
+            return path, False
+        response.raise_for_status()
+        tmp_path = f"{path}.{os.getpid()}.part"
+        with open(tmp_path, "wb") as f:
+            for block in response.iter_content(DOWNLOAD_BLOCK_SIZE):
+                f.write(block)
+                metrics.add(bytes_read=len(block))
+        os.replace(tmp_path, path)
+        etag = response.headers.get("ETag")
+        last_modified = response.headers.get("Last-Modified")
+
+    # Re-read the index so concurrent downloads don't drop each other's entries
+    with _index_lock:
+        index = load_manifest(cache_dir, HTTP_CACHE_INDEX)
+        index[url] = {"path": path, "etag": etag, "last_modified": last_modified}
+        save_manifest(index, cache_dir, HTTP_CACHE_INDEX)
+    print(f"Downloaded {url} to {path}")
+    return path, True
+
+
+def download_all(urls, cache_dir=HTTP_CACHE_DIR, max_workers=DOWNLOAD_WORKERS):
+    """Downloads several urls concurrently.
+
+    :return: {url: (path, downloaded)}
+    """
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        # copy_context carries the active metrics stage into the worker threads
+        futures = {url: pool.submit(contextvars.copy_context().run, download, url, cache_dir) for url in urls}
+    return {url: future.result() for url, future in futures.items()}
+
+
+def extract_nested_zip(zip_file, extract_to):
+    """Extracts a ZIP file, and any ZIP files nested inside it, into extract_to.
+
+    Nested ZIPs are read from memory; only the files inside them are written.
+
+    :param zip_file: Path or file object of the archive (raw bytes also accepted)
+    :return: Paths of the extracted files
+    """
+    if isinstance(zip_file, bytes):
+        zip_file = io.BytesIO(zip_file)
+    extracted = []
+    with zipfile.ZipFile(zip_file) as outer_zip:
+        for owner, member in walk_zip(outer_zip):
+            extracted.append(owner.extract(member, extract_to))
+            metrics.add(bytes_written=member.file_size)
+    return extracted
+
+
+def find_dataset_links(page_url):
+    """Scrapes the dataset page for download links."""
+    response = get_session().get(page_url, timeout=DOWNLOAD_TIMEOUT)
+    response.raise_for_status()
     soup = BeautifulSoup(response.text, 'html.parser')
 
     dataset_links = []
     for a in soup.find_all('a', href=True):
         href = a['href']
         if any(ext in href for ext in ['.zip', '.csv', '.data']):
-            full_link = href if href.startswith("http") else base_url + href
-            dataset_links.append(full_link)
+            full_link = urljoin(page_url, href)
+            if full_link not in dataset_links:
+                dataset_links.append(full_link)
+    return dataset_links
+
+
+@instrumented("extract")
+def extract_student_data(page_url="https://archive.ics.uci.edu/dataset/320/student+performance",
+                         extract_dir="data", cache_dir=HTTP_CACHE_DIR, force=False, materialize=True):
+    """Downloads the dataset archives linked from page_url and extracts them.
+
+    Archives are fetched in parallel through the HTTP cache. If none of them
+    changed and extract_dir was already populated, extraction is skipped too.
+
+    :param materialize: Extract the raw CSVs into extract_dir. If False nothing
+        is extracted; load_and_transform(archive=...) reads the CSVs straight
+        from the downloaded archive instead.
+    :return: extract_dir, or the path of the downloaded archive if not materialize
+    """
+    # Step 1: Scrape the page for download links
+    dataset_links = find_dataset_links(page_url)
 
     print("Found dataset URLs:")
     for link in dataset_links:
         print(link)
 
-    # Step 2: Download the main ZIP file (student.zip)
+    # Step 2: Download the ZIP files (student.zip), skipping unchanged ones
     zip_links = [link for link in dataset_links if link.endswith(".zip")]
     if not zip_links:
         print(" No ZIP file found.")
         return
 
-    zip_url = zip_links[0]
-    print(f"\n Downloading ZIP from: {zip_url}")
-    response = requests.get(zip_url)
+    print(f"\n Downloading ZIP from: {', '.join(zip_links)}")
+    downloads = download_all(zip_links, cache_dir)
+    if not materialize:
+        archive_path = downloads[zip_links[0]][0]
+        print(f"\n Archive available in: {archive_path}")
+        return archive_path
+
     if not os.path.exists(extract_dir):
         os.makedirs(extract_dir)
 
+    # What the last run extracted, and where
+    previous = load_manifest(cache_dir, EXTRACTED_INDEX)
+    unchanged = not any(changed for _, changed in downloads.values())
+    if (not force and unchanged and previous.get("extract_dir") == os.path.abspath(extract_dir)
+            and previous.get("files") and all(os.path.exists(path) for path in previous["files"])):
+        print(f"\n Archives unchanged. Files already available in: {extract_dir}")
+        return extract_dir
+
     # Step 3: Handle nested zip extraction
-    extract_nested_zip(response.content, extract_dir)
+    files = []
+    for path, _ in downloads.values():
+        files += extract_nested_zip(path, extract_dir)
+    save_manifest({"extract_dir": os.path.abspath(extract_dir), "files": files}, cache_dir, EXTRACTED_INDEX)
     print(f"\n Extraction completed. Files available in: {extract_dir}")
+    return extract_dir
+
 
 # Run the extract function
 if __name__ == "__main__":
@@ -1,34 +1,249 @@
-import sqlite3
-import pandas as pd
-from sqlalchemy import create_engine
+import io
 import os
+import metrics
 from dotenv import load_dotenv
+from dataset import column_kind, read_transformed_chunks, transformed_file, with_student_keys
+from db import get_engine, sqlite_engine
+from metrics import instrumented
 load_dotenv()
 
 
 # This script loads the transformed CSV data into SQLite and Postgres database
 
-def load_to_sqlite(transformed_csv = "output/transformed_students.csv", db_path="students.db"):
-    df = pd.read_csv(transformed_csv)
-    conn = sqlite3.connect(db_path)
-    df.to_sql("students", conn, if_exists="replace", index=False)
-    conn.close()
+TABLE_NAME = "students"
+KEY_COLUMN = "student_key"
+# Rows read from the transformed file per batch
+LOAD_CHUNKSIZE = 100_000
+# Columns the dashboard and reports filter on, indexed after the load
+INDEXED_COLUMNS = ["sex", "age", "subject", "address"]
+
+SQL_TYPES = {
+    "sqlite": {"text": "TEXT", "smallint": "INTEGER", "float": "REAL", "bool": "INTEGER"},
+    "postgres": {"text": "TEXT", "smallint": "SMALLINT", "float": "DOUBLE PRECISION", "bool": "BOOLEAN"},
+}
+
+# "replace" rebuilds the table; "merge" applies only inserts, updates and deletes
+LOAD_MODES = ("replace", "merge")
+
+
+def quote(name):
+    return '"' + name.replace('"', '""') + '"'
+
+
+def create_table_sql(columns, dialect, table=TABLE_NAME, prefix="CREATE TABLE"):
+    """Returns the explicitly typed CREATE TABLE statement for the students table."""
+    types = SQL_TYPES[dialect]
+    definitions = ", ".join(f"{quote(col)} {types[column_kind(col)]}" for col in columns)
+    return f"{prefix} {quote(table)} ({definitions})"
+
+
+def create_index_sql():
+    statements = [
+        f"CREATE UNIQUE INDEX {quote(f'idx_{TABLE_NAME}_{KEY_COLUMN}')} ON {quote(TABLE_NAME)} ({quote(KEY_COLUMN)})"
+    ]
+    statements += [
+        f"CREATE INDEX {quote(f'idx_{TABLE_NAME}_{col}')} ON {quote(TABLE_NAME)} ({quote(col)})"
+        for col in INDEXED_COLUMNS
+    ]
+    return statements
+
+
+def upsert_sql(columns, placeholders):
+    """INSERT ... ON CONFLICT (student_key) DO UPDATE, for SQLite and Postgres."""
+    column_list = ", ".join(quote(col) for col in columns)
+    updates = ", ".join(f"{quote(col)} = excluded.{quote(col)}" for col in columns if col != KEY_COLUMN)
+    return (
+        f"INSERT INTO {quote(TABLE_NAME)} ({column_list}) {placeholders} "
+        f"ON CONFLICT ({quote(KEY_COLUMN)}) DO UPDATE SET {updates}"
+    )
+
+
+def keyed_chunks(transformed_csv, chunksize):
+    """Yields the transformed data in typed chunks with student keys and row hashes."""
+    metrics.add(bytes_read=os.path.getsize(transformed_file(transformed_csv)))
+    seen = {}
+    for chunk in read_transformed_chunks(transformed_csv, chunksize):
+        metrics.add(rows=len(chunk))
+        yield with_student_keys(chunk, seen)
+
+
+def changed_rows(chunk, existing, seen_keys):
+    """Splits a keyed chunk into the rows to upsert and counts inserts vs updates."""
+    seen_keys.update(chunk[KEY_COLUMN])
+    recorded = chunk[KEY_COLUMN].map(existing)
+    changed = chunk[recorded != chunk["row_hash"]]
+    inserts = int(recorded[changed.index].isna().sum())
+    return changed, inserts, len(changed) - inserts
+
+
+def sqlite_rows(chunk):
+    """Converts a typed chunk into plain Python tuples for executemany."""
+    chunk = chunk.astype({col: "int64" for col in chunk.columns if column_kind(col) == "bool"})
+    values = chunk.astype(object).where(chunk.notna(), None)
+    return values.itertuples(index=False, name=None)
+
+
+def sqlite_has_keys(conn):
+    columns = [row[1] for row in conn.execute(f"PRAGMA table_info({quote(TABLE_NAME)})")]
+    return KEY_COLUMN in columns
+
+
+def _replace_sqlite(conn, transformed_csv, chunksize):
+    conn.execute(f"DROP TABLE IF EXISTS {quote(TABLE_NAME)}")
+    rows = 0
+    insert_sql = None
+    for chunk in keyed_chunks(transformed_csv, chunksize):
+        if insert_sql is None:
+            conn.execute(create_table_sql(chunk.columns, "sqlite"))
+            placeholders = ", ".join("?" for _ in chunk.columns)
+            column_list = ", ".join(quote(col) for col in chunk.columns)
+            insert_sql = f"INSERT INTO {quote(TABLE_NAME)} ({column_list}) VALUES ({placeholders})"
+        conn.executemany(insert_sql, sqlite_rows(chunk))
+        rows += len(chunk)
+
+    for statement in create_index_sql():
+        conn.execute(statement)
+    print(f"Loaded {rows} rows")
+
+
+def _merge_sqlite(conn, transformed_csv, chunksize):
+    existing = dict(conn.execute(f"SELECT {quote(KEY_COLUMN)}, row_hash FROM {quote(TABLE_NAME)}"))
+    seen_keys = set()
+    inserted = updated = 0
+    for chunk in keyed_chunks(transformed_csv, chunksize):
+        changed, inserts, updates = changed_rows(chunk, existing, seen_keys)
+        if len(changed):
+            placeholders = "VALUES (" + ", ".join("?" for _ in changed.columns) + ")"
+            conn.executemany(upsert_sql(changed.columns, placeholders), sqlite_rows(changed))
+        inserted += inserts
+        updated += updates
+
+    deleted = [(key,) for key in existing.keys() - seen_keys]
+    conn.executemany(f"DELETE FROM {quote(TABLE_NAME)} WHERE {quote(KEY_COLUMN)} = ?", deleted)
+    print(f"Merged changes: {inserted} inserted, {updated} updated, {len(deleted)} deleted")
+
+
+@instrumented("load_sqlite")
+def load_to_sqlite(transformed_csv = "output/transformed_students.csv", db_path="students.db",
+                   chunksize=LOAD_CHUNKSIZE, mode="replace"):
+    """Bulk loads the transformed data into the SQLite students table.
+
+    Rows are written with executemany per chunk inside a single transaction.
+    In "replace" mode the table is rebuilt and indexed once all rows are in.
+    In "merge" mode only rows whose student_key is new or whose row_hash changed
+    are upserted, and keys missing from the new data are deleted; it falls back
+    to "replace" when the table does not exist yet or has no student keys.
+    """
+    if mode not in LOAD_MODES:
+        raise ValueError(f"mode must be one of {LOAD_MODES}, not {mode!r}")
+
+    # Pooled connection with the WAL/synchronous pragmas from db.SQLITE_PRAGMAS
+    pooled = sqlite_engine(db_path).raw_connection()
+    conn = pooled.driver_connection
+    try:
+        conn.execute("BEGIN")
+        if mode == "merge" and sqlite_has_keys(conn):
+            _merge_sqlite(conn, transformed_csv, chunksize)
+        else:
+            _replace_sqlite(conn, transformed_csv, chunksize)
+        conn.execute("COMMIT")
+    except Exception:
+        if conn.in_transaction:
+            conn.execute("ROLLBACK")
+        raise
+    finally:
+        # Returns the connection to the pool
+        pooled.close()
     print(f"Loaded data into SQLite DB: {db_path}")
 
 
-def load_to_postgres(csv_path):
-    df = pd.read_csv(csv_path)
+def copy_chunk(cursor, chunk, table):
+    """Streams a chunk into table with COPY FROM STDIN."""
+    column_list = ", ".join(quote(col) for col in chunk.columns)
+    buffer = io.StringIO()
+    chunk.to_csv(buffer, header=False, index=False)
+    buffer.seek(0)
+    cursor.copy_expert(f"COPY {quote(table)} ({column_list}) FROM STDIN WITH (FORMAT csv)", buffer)
+
+
+def postgres_has_keys(cursor):
+    cursor.execute(
+        "SELECT 1 FROM information_schema.columns "
+        "WHERE table_schema = current_schema() AND table_name = %s AND column_name = %s",
+        (TABLE_NAME, KEY_COLUMN),
+    )
+    return cursor.fetchone() is not None
+
 
-    db_url = os.getenv("POSTGRES_URL")
-    engine = create_engine(db_url)
+def _replace_postgres(cursor, csv_path, chunksize):
+    cursor.execute(f"DROP TABLE IF EXISTS {quote(TABLE_NAME)}")
+    rows = 0
+    created = False
+    for chunk in keyed_chunks(csv_path, chunksize):
+        if not created:
+            cursor.execute(create_table_sql(chunk.columns, "postgres"))
+            created = True
+        copy_chunk(cursor, chunk, TABLE_NAME)
+        rows += len(chunk)
 
-    df.to_sql("students", engine, if_exists="replace", index=False)
-    print(f"Loaded data into PostgreSQL DB: {db_url}")
+    for statement in create_index_sql():
+        cursor.execute(statement)
+    print(f"Loaded {rows} rows")
+
+
+def _merge_postgres(cursor, csv_path, chunksize):
+    cursor.execute(f"SELECT {quote(KEY_COLUMN)}, row_hash FROM {quote(TABLE_NAME)}")
+    existing = dict(cursor.fetchall())
+    seen_keys = set()
+    inserted = updated = 0
+    stage = f"{TABLE_NAME}_stage"
+    for chunk in keyed_chunks(csv_path, chunksize):
+        changed, inserts, updates = changed_rows(chunk, existing, seen_keys)
+        if len(changed):
+            # Stage the changed rows with COPY, then upsert them in one statement
+            cursor.execute(create_table_sql(changed.columns, "postgres", stage, "CREATE TEMP TABLE IF NOT EXISTS"))
+            cursor.execute(f"TRUNCATE {quote(stage)}")
+            copy_chunk(cursor, changed, stage)
+            column_list = ", ".join(quote(col) for col in changed.columns)
+            cursor.execute(upsert_sql(changed.columns, f"SELECT {column_list} FROM {quote(stage)}"))
+        inserted += inserts
+        updated += updates
+
+    deleted = list(existing.keys() - seen_keys)
+    if deleted:
+        cursor.execute(f"DELETE FROM {quote(TABLE_NAME)} WHERE {quote(KEY_COLUMN)} = ANY(%s)", (deleted,))
+    print(f"Merged changes: {inserted} inserted, {updated} updated, {len(deleted)} deleted")
+
+
+@instrumented("load_postgres")
+def load_to_postgres(csv_path, chunksize=LOAD_CHUNKSIZE, mode="replace"):
+    """Bulk loads the transformed data into PostgreSQL with COPY FROM STDIN.
+
+    Everything runs in one transaction. "replace" drops, recreates (with
+    explicit types), fills and indexes the table; "merge" stages only new and
+    changed rows, upserts them on student_key and deletes keys that are gone.
+    """
+    if mode not in LOAD_MODES:
+        raise ValueError(f"mode must be one of {LOAD_MODES}, not {mode!r}")
+
+    engine = get_engine()
+    conn = engine.raw_connection()
+    try:
+        cursor = conn.cursor()
+        if mode == "merge" and postgres_has_keys(cursor):
+            _merge_postgres(cursor, csv_path, chunksize)
+        else:
+            _replace_postgres(cursor, csv_path, chunksize)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        # Returns the connection to the pool
+        conn.close()
+    print(f"Loaded data into PostgreSQL DB: {engine.url.render_as_string(hide_password=True)}")
 
 def main():
     csv_path = "output/transformed_students.csv"
     load_to_postgres(csv_path)
     load_to_sqlite(csv_path)
-
-
-
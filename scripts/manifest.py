@@ -0,0 +1,59 @@
+import hashlib
+import json
+import os
+
+# Records what each pipeline output was built from, so unchanged inputs can be skipped
+
+MANIFEST_NAME = "manifest.json"
+
+
+def file_hash(path, block_size=1 << 20):
+    """Returns the sha256 of a file, read in blocks."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def fingerprint(path):
+    """Returns the content hash, size and mtime of a file."""
+    stat = os.stat(path)
+    return {
+        "path": path,
+        "sha256": file_hash(path),
+        "size": stat.st_size,
+        "mtime": stat.st_mtime,
+    }
+
+
+def is_unchanged(path, recorded):
+    """Checks a file against its recorded fingerprint.
+
+    Size and mtime are checked first; the file is only hashed when they differ,
+    so a re-downloaded file with identical content still counts as unchanged.
+    """
+    if not recorded or not os.path.exists(path):
+        return False
+    stat = os.stat(path)
+    if stat.st_size != recorded["size"]:
+        return False
+    if stat.st_mtime == recorded["mtime"]:
+        return True
+    return file_hash(path) == recorded["sha256"]
+
+
+def load_manifest(output_dir, name=MANIFEST_NAME):
+    path = os.path.join(output_dir, name)
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_manifest(manifest, output_dir, name=MANIFEST_NAME):
+    path = os.path.join(output_dir, name)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, path)
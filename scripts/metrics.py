@@ -0,0 +1,183 @@
+import contextlib
+import contextvars
+import functools
+import json
+import logging
+import os
+import re
+import resource
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+
+# Per-stage metrics for the pipeline scripts and the Airflow tasks
+#
+#   @instrumented("transform")
+#   def load_and_transform(...):
+#       ...
+#       metrics.add(rows=len(chunk), bytes_written=size)
+#
+# Each stage logs one JSON line with its wall time, row and byte counts and
+# the peak RSS reached while it ran. Stages can nest; a nested stage's counts
+# are added to its parent when it ends.
+#
+# The per-stage peak comes from resetting the kernel's high-water mark
+# (VmHWM) when a stage starts. Where that isn't possible (not Linux, or
+# /proc/self/clear_refs not writable) peak_rss_mb is the process's peak so
+# far, and the record's peak_rss_scope says "process" instead of "stage".
+#
+# Settings come from the environment:
+#   PIPELINE_METRICS=0         turns instrumentation off (calls go straight through)
+#   PIPELINE_METRICS_FILE      also append the JSON lines to this file
+#   PIPELINE_METRICS_XCOM=0    don't push the outermost stage's metrics to XCom
+
+ENABLED = os.getenv("PIPELINE_METRICS", "1").lower() not in ("0", "false", "no")
+METRICS_FILE = os.getenv("PIPELINE_METRICS_FILE")
+PUSH_TO_XCOM = os.getenv("PIPELINE_METRICS_XCOM", "1").lower() not in ("0", "false", "no")
+COUNTERS = ("rows", "bytes_read", "bytes_written")
+
+logger = logging.getLogger("pipeline.metrics")
+if not logger.handlers:
+    _handler = logging.StreamHandler(sys.stdout)
+    _handler.setFormatter(logging.Formatter("%(message)s"))
+    logger.addHandler(_handler)
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+
+# Innermost active stage of the current thread or task
+_current = contextvars.ContextVar("pipeline_stage", default=None)
+_lock = threading.Lock()
+# Peak RSS (KiB) seen so far by each open stage of this process, by id(record)
+_open_peaks = {}
+
+
+def _high_water_kib():
+    """VmHWM of this process in KiB, or None where /proc isn't available."""
+    try:
+        with open("/proc/self/status") as f:
+            match = re.search(r"^VmHWM:\s+(\d+) kB", f.read(), re.MULTILINE)
+    except OSError:
+        return None
+    return int(match.group(1)) if match else None
+
+
+def reset_peak_rss():
+    """Resets this process's peak RSS to its current RSS.
+
+    :return: True if it was reset, False if the platform doesn't support it
+    """
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        return False
+    return True
+
+
+def peak_rss_mb():
+    """Peak resident memory of this process since the last reset_peak_rss, or since it started."""
+    kib = _high_water_kib()
+    if kib is None:
+        # ru_maxrss is in KiB on Linux and can't be reset
+        kib = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(kib / 1024, 1)
+
+
+def _start_peak(key):
+    """Starts measuring the peak RSS of a new stage, folding the peak so far into the open ones.
+
+    :return: False if the peak can't be measured per stage on this platform
+    """
+    with _lock:
+        peak = _high_water_kib()
+        if peak is None or not reset_peak_rss():
+            return False
+        for open_key in _open_peaks:
+            _open_peaks[open_key] = max(_open_peaks[open_key], peak)
+        _open_peaks[key] = 0
+        return True
+
+
+def _end_peak(key):
+    """Returns the peak RSS in MB since the stage started, including nested stages."""
+    with _lock:
+        peak = max(_open_peaks.pop(key), _high_water_kib() or 0)
+        return round(peak / 1024, 1)
+
+
+def add(**counts):
+    """Adds rows, bytes_read or bytes_written to the active stage, if any."""
+    current = _current.get()
+    if current is None:
+        return
+    # Stages can be shared with worker threads (see contextvars.copy_context)
+    with _lock:
+        for name, value in counts.items():
+            current[name] += value
+
+
+@contextlib.contextmanager
+def stage(name):
+    """Measures the enclosed block as one stage and logs its metrics when it ends."""
+    if not ENABLED:
+        yield None
+        return
+    parent = _current.get()
+    record = {"stage": name, "started_at": datetime.now(timezone.utc).isoformat(timespec="seconds")}
+    record.update(dict.fromkeys(COUNTERS, 0))
+    token = _current.set(record)
+    # Stages nested in this one (or running in other threads) reset the
+    # high-water mark too, so each open stage keeps the peak it has seen
+    per_stage = _start_peak(id(record))
+    start = time.perf_counter()
+    record["status"] = "error"
+    try:
+        yield record
+        record["status"] = "ok"
+    finally:
+        record["seconds"] = round(time.perf_counter() - start, 3)
+        _current.reset(token)
+        record["rows_per_sec"] = round(record["rows"] / record["seconds"]) if record["seconds"] else None
+        record["peak_rss_mb"] = _end_peak(id(record)) if per_stage else peak_rss_mb()
+        record["peak_rss_scope"] = "stage" if per_stage else "process"
+        record["pid"] = os.getpid()
+        emit(record)
+        if parent is not None:
+            with _lock:
+                for counter in COUNTERS:
+                    parent[counter] += record[counter]
+        elif PUSH_TO_XCOM:
+            push_to_xcom(record)
+
+
+def instrumented(name):
+    """Decorator that runs each call of the function as a stage."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not ENABLED:
+                return func(*args, **kwargs)
+            with stage(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def emit(record):
+    line = json.dumps(record)
+    logger.info(line)
+    if METRICS_FILE:
+        with open(METRICS_FILE, "a") as f:
+            f.write(line + "\n")
+
+
+def push_to_xcom(record):
+    """Pushes record to XCom under "metrics" when running inside an Airflow task."""
+    try:
+        from airflow.operators.python import get_current_context
+        ti = get_current_context()["ti"]
+    except Exception:
+        # Not running in Airflow, or outside a task
+        return
+    ti.xcom_push(key="metrics", value=record)
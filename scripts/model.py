@@ -0,0 +1,131 @@
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+import joblib
+from sklearn.model_selection import train_test_split
+from sklearn.ensemble import RandomForestRegressor
+from sklearn.metrics import mean_squared_error
+
+# Final grade model shared by the dashboard and the batch scripts
+
+FEATURES = ['studytime', 'G_avg', 'absences']
+TARGET = 'G3'
+DEFAULT_PARAMS = {"n_estimators": 100, "random_state": 42, "n_jobs": -1}
+
+
+def train_model(df, params=None):
+    """Fits the final grade model on df and scores it on a held-out split.
+
+    :return: dict with the fitted model, its test MSE, feature importances
+        and the test set predictions
+    """
+    params = dict(DEFAULT_PARAMS, **(params or {}))
+    features = df[FEATURES]
+    target = df[TARGET]
+
+    X_train, X_test, y_train, y_test = train_test_split(
+        features, target, test_size=0.2, random_state=42
+    )
+
+    model = RandomForestRegressor(**params)
+    model.fit(X_train, y_train)
+
+    predictions = model.predict(X_test)
+    return {
+        "model": model,
+        "mse": mean_squared_error(y_test, predictions),
+        "importances": dict(zip(FEATURES, model.feature_importances_)),
+        "predictions": predictions,
+    }
+
+
+class ModelRegistry:
+    """Trains each model once and keeps the results on disk.
+
+    Results are keyed on the dataset version, the filter selection the model
+    was trained on and the hyperparameters. A small in-memory LRU sits in front
+    of the files, and the directory is capped at max_entries files with the
+    least recently used ones evicted first.
+    """
+
+    def __init__(self, model_dir="output/models", max_entries=32, memory_entries=8):
+        self.model_dir = model_dir
+        self.max_entries = max_entries
+        self.memory_entries = memory_entries
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        os.makedirs(model_dir, exist_ok=True)
+
+    @staticmethod
+    def key_for(dataset_version, filters, params=None):
+        params = dict(DEFAULT_PARAMS, **(params or {}))
+        payload = json.dumps(
+            {"dataset": dataset_version, "filters": filters, "params": params},
+            sort_keys=True, default=str,
+        )
+        return hashlib.sha256(payload.encode()).hexdigest()[:32]
+
+    def _path(self, key):
+        return os.path.join(self.model_dir, f"{key}.joblib")
+
+    def _remember(self, key, result):
+        with self._lock:
+            self._memory[key] = result
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.memory_entries:
+                self._memory.popitem(last=False)
+
+    def get(self, key):
+        """Returns the stored result for key, or None."""
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                return self._memory[key]
+
+        path = self._path(key)
+        if not os.path.exists(path):
+            return None
+        try:
+            result = joblib.load(path)
+        except Exception as e:
+            print(f"Discarding unreadable model {path}: {e}")
+            os.remove(path)
+            return None
+        # Mark as recently used for eviction
+        os.utime(path)
+        self._remember(key, result)
+        return result
+
+    def put(self, key, result):
+        path = self._path(key)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        joblib.dump(result, tmp_path)
+        os.replace(tmp_path, path)
+        self._remember(key, result)
+        self._evict()
+
+    def _evict(self):
+        files = [
+            os.path.join(self.model_dir, name)
+            for name in os.listdir(self.model_dir)
+            if name.endswith(".joblib")
+        ]
+        if len(files) <= self.max_entries:
+            return
+        files.sort(key=os.path.getmtime)
+        for path in files[:len(files) - self.max_entries]:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def get_or_train(self, df, dataset_version, filters, params=None):
+        """Returns the stored result for this training set, fitting it if needed."""
+        key = self.key_for(dataset_version, filters, params)
+        result = self.get(key)
+        if result is None:
+            result = train_model(df, params)
+            self.put(key, result)
+        return result
@@ -0,0 +1,150 @@
+import argparse
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import joblib
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from dataset import KEY_COLUMNS, apply_dtypes, parquet_path_for, read_transformed, student_keys
+from model import FEATURES, train_model
+
+# Trains the final grade model and scores student files outside the dashboard
+#
+#   python scripts/predict.py train
+#   python scripts/predict.py predict --input output/transformed_students.csv
+#
+# Each prediction is written with the row's student_key, the key the load
+# step gives the same row in the students table, so scores can be joined back.
+
+MODEL_PATH = "output/final_grade_model.joblib"
+PREDICTION_COLUMN = "Predicted Final Grade"
+KEY_COLUMN = "student_key"
+
+# Model loaded once per worker process
+_worker_model = None
+
+
+def train(data_path="output/transformed_students.csv", model_path=MODEL_PATH):
+    """Fits the final grade model on every core and saves it to model_path."""
+    df = read_transformed(data_path)
+    result = train_model(df)
+    joblib.dump(result, model_path)
+    print(f"Trained on {len(df)} rows, test MSE: {result['mse']:.2f}")
+    print(f"Model saved to: {model_path}")
+    return result
+
+
+def _init_worker(model_path):
+    global _worker_model
+    _worker_model = joblib.load(model_path)["model"]
+    # Parallelism comes from the process pool, not from each predict call
+    _worker_model.n_jobs = 1
+
+
+def _predict_batch(features):
+    return _worker_model.predict(features)
+
+
+def iter_feature_batches(input_path, batch_size):
+    """Yields the model features and key columns of a transformed CSV or Parquet file in batches."""
+    columns = list(dict.fromkeys(FEATURES + KEY_COLUMNS))
+    if input_path.endswith(".parquet"):
+        parquet_file = pq.ParquetFile(input_path)
+        missing = set(columns) - set(parquet_file.schema_arrow.names)
+        if missing:
+            raise ValueError(f"{input_path} lacks the columns {sorted(missing)}")
+        for batch in parquet_file.iter_batches(batch_size=batch_size, columns=columns):
+            yield batch.to_pandas()
+        return
+    try:
+        reader = pd.read_csv(input_path, usecols=columns, chunksize=batch_size)
+    except ValueError as e:
+        raise ValueError(f"{input_path} lacks some of the columns {columns}: {e}") from None
+    with reader:
+        for chunk in reader:
+            # Typed like the load step's rows, so the student keys match
+            yield apply_dtypes(chunk)
+
+
+def predict(input_path="output/transformed_students.csv", output_path="output/predictions.csv",
+            model_path=MODEL_PATH, batch_size=100_000, workers=None):
+    """Scores input_path in parallel batches and writes one prediction per row.
+
+    Batches are scored by a process pool and written in input order, with at
+    most two batches per worker in flight so memory stays bounded. Each
+    prediction is written next to the row's student_key. Output is Parquet if
+    output_path ends in .parquet, otherwise CSV.
+    """
+    # Prefer the typed columnar copy of a transformed CSV when there is one
+    if input_path.endswith(".csv") and os.path.exists(parquet_path_for(input_path)):
+        input_path = parquet_path_for(input_path)
+
+    workers = workers or os.cpu_count()
+    columnar = output_path.endswith(".parquet")
+    writer = None
+    header = True
+    rows = 0
+    # Occurrence counts of the key hashes, carried across batches (see student_keys)
+    seen = {}
+
+    def write(keys, predictions):
+        nonlocal writer, header, rows
+        out = pd.DataFrame({KEY_COLUMN: keys, PREDICTION_COLUMN: predictions})
+        if columnar:
+            table = pa.Table.from_pandas(out, preserve_index=False)
+            if writer is None:
+                writer = pq.ParquetWriter(output_path, table.schema)
+            writer.write_table(table)
+        else:
+            out.to_csv(output_path, mode="w" if header else "a", header=header, index=False)
+            header = False
+        rows += len(out)
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(model_path,)) as pool:
+        pending = deque()
+        for batch in iter_feature_batches(input_path, batch_size):
+            keys = student_keys(batch, seen)
+            pending.append((keys, pool.submit(_predict_batch, batch[FEATURES])))
+            if len(pending) >= workers * 2:
+                keys, future = pending.popleft()
+                write(keys, future.result())
+        while pending:
+            keys, future = pending.popleft()
+            write(keys, future.result())
+
+    if writer is not None:
+        writer.close()
+    print(f"Scored {rows} rows with {workers} workers")
+    print(f"Predictions saved to: {output_path}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Train the final grade model and score student files")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    train_parser = commands.add_parser("train", help="fit the model on all cores")
+    train_parser.add_argument("--data", default="output/transformed_students.csv")
+    train_parser.add_argument("--model", default=MODEL_PATH)
+
+    predict_parser = commands.add_parser("predict", help="score a transformed student file")
+    predict_parser.add_argument("--input", default="output/transformed_students.csv")
+    predict_parser.add_argument("--output", default="output/predictions.csv")
+    predict_parser.add_argument("--model", default=MODEL_PATH)
+    predict_parser.add_argument("--data", default="output/transformed_students.csv",
+                                help="data to train on if --model doesn't exist yet")
+    predict_parser.add_argument("--batch-size", type=int, default=100_000)
+    predict_parser.add_argument("--workers", type=int, default=None)
+
+    args = parser.parse_args()
+    if args.command == "train":
+        train(args.data, args.model)
+    else:
+        # Never train on the file being scored: it may have no G3, and its rows would leak into training
+        if not os.path.exists(args.model):
+            train(args.data, args.model)
+        predict(args.input, args.output, args.model, args.batch_size, args.workers)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,224 @@
+import hashlib
+import inspect
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+import matplotlib
+matplotlib.use("Agg")  # Headless: never open a window
+import matplotlib.pyplot as plt
+import pandas as pd
+import seaborn as sns
+from aggregates import compute_aggregates
+from cube import cube_aggregates, cube_is_current, cube_path_for, read_cube
+from dataset import read_transformed, transformed_file
+from manifest import fingerprint, is_unchanged, load_manifest, save_manifest
+
+# Registry of the PNG plots written to output/, rendered in parallel and only
+# when the data they use or their drawing code changed
+
+PLOTS_MANIFEST = "plots.json"
+
+# name -> {"draw": function(df, aggregates), "columns": columns the plot reads, or None for all,
+#          "rows": False if it only draws from the per-dimension aggregates}
+PLOTS = {}
+
+# Dataset and its per-dimension aggregates used by the render workers
+_df = None
+_aggregates = None
+
+
+def plot(name, columns=None, rows=True):
+    """Registers a function that draws the plot saved as output/<name>.png."""
+    def register(draw):
+        PLOTS[name] = {"draw": draw, "columns": columns, "rows": rows}
+        return draw
+    return register
+
+
+@plot("average_grade_distribution", ["G_avg"])
+def average_grade_distribution(df, aggregates):
+    sns.histplot(df['G_avg'], bins=20, kde=True)
+    plt.title("Average Grade Distribution")
+    plt.xlabel("Average Grade")
+    plt.ylabel("Frequency")
+
+
+@plot("pass_fail_distribution", ["pass"])
+def pass_fail_distribution(df, aggregates):
+    sns.countplot(x='pass', data=df)
+    plt.title("Pass/Fail Distribution")
+    plt.xlabel("Pass")
+    plt.ylabel("Count")
+
+
+@plot("correlation_heatmap")
+def correlation_heatmap(df, aggregates):
+    sns.heatmap(df.corr(numeric_only=True), annot=True, fmt=".2f", cmap='coolwarm', square=True)
+    plt.title("Correlation Heatmap")
+
+
+@plot("study_time_vs_final_grade", ["studytime", "G3"])
+def study_time_vs_final_grade(df, aggregates):
+    sns.scatterplot(x='studytime', y='G3', data=df)
+    plt.title("Study Time vs Final Grade (G3)")
+    plt.xlabel("Study Time")
+    plt.ylabel("Final Grade (G3)")
+
+
+@plot("study_time_vs_average_grade", ["studytime", "G_avg"])
+def study_time_vs_average_grade(df, aggregates):
+    sns.scatterplot(x='studytime', y='G_avg', data=df)
+    plt.title("Study Time vs Average Grade")
+    plt.xlabel("Study Time")
+    plt.ylabel("Average Grade")
+
+
+def pass_rate_plot(name, column, label):
+    """Registers a bar plot of the pass rate for each value of column."""
+    @plot(name, [column, "pass"], rows=False)
+    def draw(df, aggregates):
+        pass_rate = aggregates[column].reset_index()
+        sns.barplot(x=column, y='pass_rate', data=pass_rate)
+        plt.title(f"Pass Rate by {label}")
+        plt.xlabel(label)
+        plt.ylabel("Pass Rate")
+    return draw
+
+
+pass_rate_plot("pass_rate_by_subject", "subject", "Subject")
+pass_rate_plot("pass_rate_by_study_time", "studytime", "Study Time")
+pass_rate_plot("pass_rate_by_family_size", "famsize", "Family Size")
+pass_rate_plot("pass_rate_by_internet_access", "internet", "Internet Access")
+pass_rate_plot("pass_rate_by_romantic_relationship", "romantic", "Romantic Relationship")
+pass_rate_plot("pass_rate_by_age", "age", "Age")
+pass_rate_plot("pass_rate_by_address", "address", "Address")
+pass_rate_plot("pass_rate_by_gender", "sex", "Gender")
+
+
+def plot_fingerprint(name, df=None, version=None):
+    """Hashes a plot's drawing code together with the data it reads.
+
+    :param df: Loaded dataset; only the columns the plot reads are hashed
+    :param version: Data version (data_version) used instead of df, when the
+        dataset isn't loaded
+    """
+    spec = PLOTS[name]
+    columns = spec["columns"] or (list(df.columns) if df is not None else None)
+    digest = hashlib.sha256(inspect.getsource(spec["draw"]).encode())
+    # pass_rate_plot specs share their source, so include the name and columns
+    digest.update(f"{name}:{columns}".encode())
+    if df is not None:
+        digest.update(pd.util.hash_pandas_object(df[columns], index=False).to_numpy().tobytes())
+    else:
+        digest.update(version.encode())
+    return digest.hexdigest()
+
+
+def data_version(data_path):
+    """Content hash of the dataset at data_path, without loading it.
+
+    Taken from the transform's manifest while it still describes the file;
+    otherwise the file read_transformed would load is hashed in blocks.
+    """
+    recorded = load_manifest(os.path.dirname(data_path)).get("output")
+    if recorded and is_unchanged(data_path, recorded):
+        return recorded["sha256"]
+    return fingerprint(transformed_file(data_path))["sha256"]
+
+
+def load_aggregates(data_path, df):
+    """Per-dimension aggregates, read from the transform's summary cube when it is current."""
+    if cube_is_current(data_path):
+        return cube_aggregates(read_cube(cube_path_for(data_path)))
+    return compute_aggregates(df)
+
+
+def _init_worker(data_path):
+    global _df, _aggregates
+    # Forked workers inherit the parent's data; others load it once
+    if _df is None:
+        _df = read_transformed(data_path)
+        _aggregates = load_aggregates(data_path, _df)
+
+
+def _worker_context():
+    """Picks how render workers are started.
+
+    Forked workers share the loaded frame instead of re-reading it, but forking
+    a process with other threads running (e.g. the Streamlit server) can leave
+    the child stuck on a lock one of those threads held. Such processes start
+    workers with forkserver or spawn; _init_worker then maps the dataset.
+    """
+    methods = multiprocessing.get_all_start_methods()
+    if "fork" in methods and threading.active_count() == 1:
+        return multiprocessing.get_context("fork")
+    return multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
+
+
+def _render(name, output_dir):
+    fig = plt.figure()
+    try:
+        PLOTS[name]["draw"](_df, _aggregates)
+        fig.savefig(os.path.join(output_dir, f"{name}.png"))
+    finally:
+        plt.close(fig)
+    return name
+
+
+def render_plots(data_path="output/transformed_students.csv", output_dir="output",
+                 names=None, workers=None, force=False, df=None, lazy=False):
+    """Renders the registered plots whose data or drawing code changed.
+
+    :param names: Plots to consider; all registered plots by default
+    :param workers: Size of the process pool; plots render in this process
+        when it is 1 or only one plot is stale
+    :param force: Re-render even plots that are up to date
+    :param df: Already loaded dataset, to avoid reading data_path again
+    :param lazy: Never load the dataset in this process (e.g. the dashboard
+        with a SQL backend). Plots are then fingerprinted by the data version,
+        per-dimension plots are drawn from the summary cube, and plots that
+        need the rows are drawn by worker processes that load the dataset
+    :return: Names of the plots that were rendered
+    """
+    global _df, _aggregates
+    os.makedirs(output_dir, exist_ok=True)
+    if df is None and not lazy:
+        df = read_transformed(data_path)
+    names = list(names or PLOTS)
+
+    manifest = load_manifest(output_dir, PLOTS_MANIFEST)
+    version = data_version(data_path) if df is None else None
+    fingerprints = {name: plot_fingerprint(name, df, version) for name in names}
+    stale = [
+        name for name in names
+        if force
+        or manifest.get(name) != fingerprints[name]
+        or not os.path.exists(os.path.join(output_dir, f"{name}.png"))
+    ]
+
+    workers = min(workers or os.cpu_count(), len(stale))
+    if df is None:
+        # Without the rows, only plots drawn from a current cube render here;
+        # the others go to workers that load the dataset themselves
+        in_process = cube_is_current(data_path) and not any(PLOTS[name]["rows"] for name in stale)
+    else:
+        in_process = workers <= 1
+    _df = df
+    # The summary cube (or one pass over the data) serves every per-dimension plot
+    _aggregates = load_aggregates(data_path, df) if stale and in_process else None
+    try:
+        if not stale or in_process:
+            rendered = [_render(name, output_dir) for name in stale]
+        else:
+            with ProcessPoolExecutor(max_workers=workers, mp_context=_worker_context(),
+                                     initializer=_init_worker, initargs=(data_path,)) as pool:
+                rendered = list(pool.map(_render, stale, [output_dir] * len(stale)))
+    finally:
+        _df = None
+        _aggregates = None
+
+    manifest.update({name: fingerprints[name] for name in rendered})
+    save_manifest(manifest, output_dir, PLOTS_MANIFEST)
+    print(f"Rendered {len(rendered)} plots, {len(names) - len(rendered)} up to date")
+    return rendered
@@ -0,0 +1,97 @@
+import argparse
+import csv
+import io
+import os
+import zipfile
+import numpy as np
+import pandas as pd
+from transform import SUBJECT_FILES
+
+# Generates large student-mat/por style files for benchmarks
+#
+#   python scripts/synthetic.py --rows 1000000 --output-dir benchmarks/data --archive
+#
+# Rows are resampled from the bundled files, so the joint distribution of the
+# attributes (and the grade correlations) matches the real data, and then
+# jittered so the output is not just copies of the same ~1,000 students.
+
+GRADE_COLUMNS = ["G1", "G2", "G3"]
+# Rows generated and written at a time
+GENERATE_CHUNKSIZE = 1_000_000
+
+
+def jitter(df, rng):
+    """Nudges grades and absences of resampled rows by small random amounts."""
+    for col in GRADE_COLUMNS:
+        shift = rng.choice([-1, 0, 1], size=len(df), p=[0.15, 0.7, 0.15])
+        # A 0 final grade means the student dropped out; keep those as they are
+        shift[df[col].to_numpy() == 0] = 0
+        df[col] = np.clip(df[col].to_numpy() + shift, 0, 20)
+    df["absences"] = np.clip(df["absences"].to_numpy() + rng.integers(-2, 3, size=len(df)), 0, 93)
+    return df
+
+
+def write_raw(df, path, header):
+    """Writes rows in the raw UCI layout: ';' separated, text and G1/G2 quoted."""
+    df = df.astype({"G1": str, "G2": str})
+    with open(path, "w" if header else "a", newline="") as f:
+        if header:
+            f.write(";".join(df.columns) + "\n")
+        df.to_csv(f, sep=";", header=False, index=False, quoting=csv.QUOTE_NONNUMERIC)
+
+
+def generate_subject(source_path, output_path, rows, seed=0, chunksize=GENERATE_CHUNKSIZE):
+    """Writes rows synthetic records resampled from source_path to output_path."""
+    source = pd.read_csv(source_path, sep=";")
+    rng = np.random.default_rng(seed)
+    written = 0
+    while written < rows:
+        size = min(chunksize, rows - written)
+        sample = source.iloc[rng.integers(0, len(source), size=size)].reset_index(drop=True)
+        write_raw(jitter(sample, rng), output_path, header=written == 0)
+        written += size
+    return written
+
+
+def write_archive(paths, archive_path):
+    """Packs the files into a ZIP nested inside another, like the UCI download."""
+    inner = io.BytesIO()
+    with zipfile.ZipFile(inner, "w", zipfile.ZIP_DEFLATED) as inner_zip:
+        for path in paths:
+            inner_zip.write(path, os.path.basename(path))
+    with zipfile.ZipFile(archive_path, "w") as outer_zip:
+        outer_zip.writestr("student.zip", inner.getvalue())
+    return archive_path
+
+
+def generate(rows, output_dir="benchmarks/data", source_dir="data", seed=0, archive=False):
+    """Generates rows records per subject file into output_dir.
+
+    :param archive: Also pack the files into output_dir/student.zip
+    :return: Paths of the generated files
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    paths = []
+    for i, file_name in enumerate(SUBJECT_FILES.values()):
+        path = os.path.join(output_dir, file_name)
+        generate_subject(os.path.join(source_dir, file_name), path, rows, seed + i)
+        paths.append(path)
+        print(f"Generated {rows} rows in {path}")
+    if archive:
+        print(f"Packed archive: {write_archive(paths, os.path.join(output_dir, 'student.zip'))}")
+    return paths
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate synthetic student-mat/por style files")
+    parser.add_argument("--rows", type=int, default=100_000, help="rows per subject file")
+    parser.add_argument("--output-dir", default="benchmarks/data")
+    parser.add_argument("--source-dir", default="data")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--archive", action="store_true", help="also write a nested student.zip")
+    args = parser.parse_args()
+    generate(args.rows, args.output_dir, args.source_dir, args.seed, args.archive)
+
+
+if __name__ == "__main__":
+    main()
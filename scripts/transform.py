@@ -1,39 +1,310 @@
 import pandas as pd
+import pyarrow.parquet as pq
+import pyarrow as pa
+import shutil
 import os
+import re
+import metrics
+from archive import member_info, open_member
+from cube import build_cube, cube_path_for, merge_cubes, read_cube, write_cube
+from dataset import RAW_DTYPES, apply_dtypes, arrow_path_for, parquet_path_for, validate_raw, write_arrow
+from manifest import fingerprint, is_unchanged, load_manifest, save_manifest
+from metrics import instrumented
 
-def load_and_transform(input_dir="data", output_dir="output"):
-    # Load the CSVs
-    mat_path = os.path.join(input_dir, "student-mat.csv")
-    por_path = os.path.join(input_dir, "student-por.csv")
+# Raw file for each subject, in the order the subjects appear in the output
+SUBJECT_FILES = {
+    "Math": "student-mat.csv",
+    "Portuguese": "student-por.csv",
+}
 
-    mat_df = pd.read_csv(mat_path, sep=';')
-    por_df = pd.read_csv(por_path, sep=';')
+# Other raw files named like this are picked up as extra subjects
+SUBJECT_FILE_PATTERN = re.compile(r"student-(\w+)\.csv")
+
+# Columns to not appear in final output
+DROP_COLUMNS = ["school", "guardian"]
 
-    print(f"Math dataset shape: {mat_df.shape}")
-    print(f"Portuguese dataset shape: {por_df.shape}")
-    # Subject label for each context
-    mat_df["subject"] = "Math"
-    por_df["subject"] = "Portuguese"
 
-    # Combining datasets
-    combined_df = pd.concat([mat_df, por_df], ignore_index=True)
+def transform_frame(df, subject):
+    """Adds the subject label and derived columns to a frame of raw rows."""
+    # Subject label for each context
+    df["subject"] = subject
 
     # Create average grade
-    combined_df["G_avg"] = combined_df[["G1", "G2", "G3"]].mean(axis=1)
+    df["G_avg"] = df[["G1", "G2", "G3"]].mean(axis=1)
 
     # Create pass/fail flag (pass if G3 >= 10)
-    combined_df["pass"] = combined_df["G3"] >= 10
+    df["pass"] = df["G3"] >= 10
 
-    # Columns to not appear in final output
-    combined_df = combined_df.drop(columns=["school", "guardian"])
+    return df.drop(columns=DROP_COLUMNS)
 
-    # Save the transformed dataset
-    if not os.path.exists(output_dir):
-        os.makedirs(output_dir)
-    
+
+def read_chunks(path, chunksize=None):
+    """Yields the rows of a raw subject file, all at once or in chunks.
+
+    :param path: Path of the file, or an open binary stream of it
+    """
+    if not chunksize:
+        yield pd.read_csv(path, sep=';', dtype=RAW_DTYPES)
+        return
+    with pd.read_csv(path, sep=';', dtype=RAW_DTYPES, chunksize=chunksize) as reader:
+        yield from reader
+
+
+def rejected_path_for(csv_path):
+    """Returns the side file that collects the rows rejected while building csv_path."""
+    return os.path.splitext(csv_path)[0] + ".rejected.csv"
+
+
+def transform_subject(path, subject, partition_path, chunksize=None, columnar=True):
+    """Transforms one subject file (path or stream) into its partition CSV (and Parquet) file.
+
+    Rows are validated against the raw schema first (dataset.validate_raw);
+    rows that fail go to the partition's rejected file with the reason.
+    With a chunksize only one chunk is held in memory at a time, so memory use
+    is bounded by chunksize rather than by the size of the input file.
+    """
+    with metrics.stage(f"transform.{subject}"):
+        rows = _transform_subject(path, subject, partition_path, chunksize, columnar)
+        outputs = [partition_path, rejected_path_for(partition_path), cube_path_for(partition_path)]
+        if columnar:
+            outputs.append(parquet_path_for(partition_path))
+        metrics.add(
+            rows=rows,
+            # Streams from an archive report how far they were read (uncompressed)
+            bytes_read=os.path.getsize(path) if isinstance(path, str) else path.tell(),
+            bytes_written=sum(os.path.getsize(output) for output in outputs),
+        )
+    return rows
+
+
+def _transform_subject(path, subject, partition_path, chunksize, columnar):
+    header = True
+    writer = None
+    rows = 0
+    rejected_rows = 0
+    cubes = []
+    for chunk in read_chunks(path, chunksize):
+        chunk, rejected = validate_raw(chunk)
+        rejected.insert(len(rejected.columns) - 1, "subject", subject)
+        rejected.to_csv(rejected_path_for(partition_path), mode="w" if header else "a", header=header, index=False)
+        rejected_rows += len(rejected)
+
+        chunk = transform_frame(chunk, subject)
+        chunk.to_csv(partition_path, mode="w" if header else "a", header=header, index=False)
+        header = False
+        rows += len(chunk)
+
+        typed = apply_dtypes(chunk)
+        cubes.append(build_cube(typed))
+        if columnar:
+            table = pa.Table.from_pandas(typed, preserve_index=False)
+            if writer is None:
+                writer = pq.ParquetWriter(parquet_path_for(partition_path), table.schema)
+            writer.write_table(table)
+
+    if writer is not None:
+        writer.close()
+    write_cube(merge_cubes(cubes), cube_path_for(partition_path))
+    print(f"{subject} dataset rows: {rows}")
+    if rejected_rows:
+        print(f"{subject} rejected rows: {rejected_rows}, see {rejected_path_for(partition_path)}")
+    return rows
+
+
+def concat_csv(paths, output_path):
+    with open(output_path, "wb") as out:
+        for i, path in enumerate(paths):
+            with open(path, "rb") as f:
+                # The header is only written once
+                if i > 0:
+                    f.readline()
+                shutil.copyfileobj(f, out)
+
+
+def combine_partitions(partition_paths, output_path, columnar=True):
+    """Concatenates the subject partitions into the combined output files."""
+    concat_csv(partition_paths, output_path)
+    concat_csv([rejected_path_for(path) for path in partition_paths], rejected_path_for(output_path))
+
+    parquet_path = parquet_path_for(output_path)
+    arrow_path = arrow_path_for(output_path)
+    if not columnar:
+        # Readers prefer the Arrow and Parquet files, so never leave them from an older run
+        for path in (parquet_path, arrow_path):
+            if os.path.exists(path):
+                os.remove(path)
+        return
+
+    writer = None
+    for partition_path in partition_paths:
+        partition = pq.ParquetFile(parquet_path_for(partition_path))
+        if writer is None:
+            writer = pq.ParquetWriter(parquet_path, partition.schema_arrow)
+        for i in range(partition.num_row_groups):
+            writer.write_table(partition.read_row_group(i))
+    writer.close()
+
+    # The memory-mapped copy the dashboard, plots and loaders read
+    write_arrow(parquet_path, arrow_path)
+
+
+def archive_input(archive, file_name, members):
+    """Identifies a subject file inside an archive by its member CRC and size."""
+    if file_name not in members:
+        raise FileNotFoundError(f"{file_name} not found in {archive}")
+    return dict(members[file_name], archive=archive, member=file_name)
+
+
+def archive_input_unchanged(current, recorded):
+    return bool(recorded) and all(recorded.get(key) == current[key] for key in ("member", "crc", "size"))
+
+
+def discover_subjects(input_dir="data", archive=None):
+    """Returns {subject: file name} for the subject files to transform.
+
+    The SUBJECT_FILES are always included. Any other student-<name>.csv file
+    found in input_dir (or in the archive) becomes an extra subject <name>.
+    """
+    if archive:
+        names = member_info(archive)
+    else:
+        names = os.listdir(input_dir) if os.path.isdir(input_dir) else []
+    subjects = dict(SUBJECT_FILES)
+    known = set(SUBJECT_FILES.values())
+    for name in sorted(names):
+        match = SUBJECT_FILE_PATTERN.fullmatch(name)
+        if match and name not in known:
+            subjects[match.group(1)] = name
+    return subjects
+
+
+def transform_partition(subject, file_name, input_dir="data", output_dir="output", chunksize=None,
+                        columnar=True, force=False, archive=None):
+    """Builds one subject's partition under output_dir/partitions, unless its input is unchanged.
+
+    partitions/<subject>.json records the input the partition was built from,
+    so partitions can be built independently (and concurrently) of each other.
+
+    :return: {"subject", "partition", "changed"}, for combine_transformed
+    """
+    partition_dir = os.path.join(output_dir, "partitions")
+    os.makedirs(partition_dir, exist_ok=True)
+    partition_path = os.path.join(partition_dir, f"{subject}.csv")
+    manifest_name = f"{subject}.json"
+
+    manifest = {} if force else load_manifest(partition_dir, manifest_name)
+    # Partitions built with a different output format can't be reused
+    recorded = manifest.get("input") if manifest.get("columnar") == columnar else None
+    built = all(os.path.exists(path) for path in
+                (partition_path, rejected_path_for(partition_path), cube_path_for(partition_path)))
+
+    if archive:
+        current = archive_input(archive, file_name, member_info(archive))
+        unchanged = built and archive_input_unchanged(current, recorded)
+    else:
+        path = os.path.join(input_dir, file_name)
+        # A partition last built from an archive has no file fingerprint to compare
+        unchanged = built and "sha256" in (recorded or {}) and is_unchanged(path, recorded)
+        # Keep the refreshed mtime so the next run skips hashing
+        current = dict(recorded, path=path, mtime=os.stat(path).st_mtime) if unchanged else fingerprint(path)
+
+    if not unchanged:
+        # Drop the record before rebuilding: if the rebuild fails partway, the
+        # next run must not match the input and reuse half-written files
+        manifest_path = os.path.join(partition_dir, manifest_name)
+        if os.path.exists(manifest_path):
+            os.remove(manifest_path)
+
+    if unchanged:
+        print(f"{subject} input unchanged, reusing {partition_path}")
+    elif archive:
+        with open_member(archive, file_name) as source:
+            transform_subject(source, subject, partition_path, chunksize, columnar)
+    else:
+        transform_subject(path, subject, partition_path, chunksize, columnar)
+
+    save_manifest({"columnar": columnar, "input": current}, partition_dir, manifest_name)
+    return {"subject": subject, "partition": partition_path, "changed": not unchanged}
+
+
+@instrumented("transform.combine")
+def combine_transformed(partitions, output_dir="output", columnar=True):
+    """Combines built partitions into output_dir/transformed_students.csv.
+
+    :param partitions: transform_partition results, in output order
+    :return: Path of the transformed CSV
+    """
+    partitions = list(partitions)
     output_path = os.path.join(output_dir, "transformed_students.csv")
-    combined_df.to_csv(output_path, index=False)
+    subjects = [partition["subject"] for partition in partitions]
+
+    manifest = load_manifest(output_dir)
+    changed = (
+        any(partition["changed"] for partition in partitions)
+        or manifest.get("subjects") != subjects
+        or manifest.get("columnar") != columnar
+    )
+    cube_path = cube_path_for(output_path)
+    if not changed and is_unchanged(output_path, manifest.get("output")) and os.path.exists(cube_path):
+        print(f"\n No input changes, {output_path} is up to date")
+        return output_path
+
+    # Save the transformed dataset
+    partition_paths = [partition["partition"] for partition in partitions]
+    combine_partitions(partition_paths, output_path, columnar)
+    # The summary cube is the sum of the partition cubes, so only changed partitions were recounted
+    write_cube(merge_cubes([read_cube(cube_path_for(path)) for path in partition_paths]), cube_path)
+    columnar_outputs = [parquet_path_for(output_path), arrow_path_for(output_path)] if columnar else []
+    outputs = [output_path, rejected_path_for(output_path), cube_path] + columnar_outputs
+    metrics.add(bytes_written=sum(os.path.getsize(path) for path in outputs))
     print(f"\n Transformed data saved to: {output_path}")
+    if columnar:
+        print(f" Typed columnar data saved to: {', '.join(columnar_outputs)}")
+    print(f" Summary cube saved to: {cube_path}")
+
+    save_manifest({
+        "columnar": columnar,
+        "subjects": subjects,
+        "output": fingerprint(output_path),
+    }, output_dir)
+    return output_path
+
+
+@instrumented("transform")
+def load_and_transform(input_dir="data", output_dir="output", chunksize=None, columnar=True, force=False,
+                       archive=None):
+    """Combines the subject files into output/transformed_students.csv.
+
+    Each subject is transformed into its own partition under output/partitions
+    (transform_partition), and the partitions are then concatenated
+    (combine_transformed). Subjects whose input file is unchanged are not
+    recomputed, and the run is a no-op when no input changed. A summary cube
+    of grouped counts (cube.py) is written next to the output and kept up to
+    date the same way, partition by partition. Rows that fail
+    schema validation are left out and written to
+    output/transformed_students.rejected.csv instead.
+
+    :param chunksize: If set, stream each subject file in chunks of this many
+        rows instead of loading it into memory. The output is the same.
+        Memory is then bounded by chunksize, except for the Arrow file written
+        with columnar output (see below).
+    :param columnar: Also write a typed transformed_students.parquet, and the
+        memory-mapped transformed_students.arrow, which consumers read instead
+        of the CSV. Writing the Arrow file holds the combined dataset in
+        memory once, in its compact typed form (about 40 bytes per row), so
+        that every column is one contiguous array readers can share without
+        copying. Pass columnar=False to keep memory bounded by chunksize alone.
+    :param force: Recompute every partition even if its input is unchanged
+    :param archive: Read the subject files straight out of this (nested) ZIP
+        archive instead of input_dir, so the raw CSVs are never written to disk
+    :return: Path of the transformed CSV
+    """
+    partitions = [
+        transform_partition(subject, file_name, input_dir, output_dir, chunksize, columnar, force, archive)
+        for subject, file_name in discover_subjects(input_dir, archive).items()
+    ]
+    return combine_transformed(partitions, output_dir, columnar)
+
 
 if __name__ == "__main__":
     load_and_transform()
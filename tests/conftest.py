@@ -0,0 +1,8 @@
+import os
+import sys
+
+# The pipeline modules import each other as top-level names, the way app.py
+# and the Airflow DAG put scripts/ and app/ on the path
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for directory in ("scripts", "app"):
+    sys.path.insert(0, os.path.join(ROOT, directory))
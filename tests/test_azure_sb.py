@@ -0,0 +1,120 @@
+import itertools
+from types import SimpleNamespace
+import pytest
+from azure.core.exceptions import ResourceNotFoundError
+import azure_sb
+from upload_ledger import UploadLedger
+
+CONTAINER = "students"
+_etags = itertools.count(1)
+
+
+class FakeBlobClient:
+    """In-memory stand-in for azure.storage.blob.BlobClient."""
+
+    def __init__(self):
+        self.data = None
+        self.md5 = None
+        self.etag = None
+        self.staged = {}
+        self.calls = []
+
+    def get_blob_properties(self):
+        if self.data is None:
+            raise ResourceNotFoundError("BlobNotFound")
+        return SimpleNamespace(etag=self.etag, content_settings=SimpleNamespace(content_md5=self.md5))
+
+    def _store(self, data, content_settings):
+        self.data = data
+        self.md5 = content_settings.content_md5 if content_settings else None
+        self.etag = f'"{next(_etags)}"'
+
+    def upload_blob(self, data, overwrite=False, content_settings=None):
+        self.calls.append("upload_blob")
+        self._store(data.read(), content_settings)
+
+    def stage_block(self, block_id, data):
+        self.calls.append("stage_block")
+        self.staged[block_id] = data
+
+    def commit_block_list(self, blocks, content_settings=None):
+        self.calls.append("commit_block_list")
+        self._store(b"".join(self.staged.pop(block.id) for block in blocks), content_settings)
+
+
+class FakeServiceClient:
+    def __init__(self):
+        self.blobs = {}
+
+    def get_container_client(self, container_name):
+        return SimpleNamespace(get_blob_client=lambda blob_name: self.blobs.setdefault(
+            (container_name, blob_name), FakeBlobClient()))
+
+
+@pytest.fixture
+def service(tmp_path, monkeypatch):
+    service = FakeServiceClient()
+    ledger = UploadLedger(str(tmp_path / "ledger.json"))
+    monkeypatch.setattr(azure_sb, "get_blob_service_client", lambda: service)
+    monkeypatch.setattr(azure_sb, "default_ledger", lambda: ledger)
+    return service
+
+
+@pytest.fixture
+def csv_file(tmp_path):
+    path = tmp_path / "students.csv"
+    path.write_bytes(b"school,sex,age,G3\n" * 100)
+    return str(path)
+
+
+def test_large_file_is_staged_in_blocks(service, csv_file):
+    assert azure_sb.upload_file_to_azure(csv_file, CONTAINER, "students.csv", block_size=256)
+    blob = service.blobs[(CONTAINER, "students.csv")]
+    assert blob.calls.count("stage_block") == -(-len(open(csv_file, "rb").read()) // 256)
+    assert blob.calls[-1] == "commit_block_list"
+    assert blob.data == open(csv_file, "rb").read()
+    assert bytes(blob.md5) == azure_sb.file_md5(csv_file)
+
+
+def test_skip_if_same_compares_md5(service, csv_file):
+    assert azure_sb.upload_file_to_azure(csv_file, CONTAINER, "students.csv", use_ledger=False)
+    blob = service.blobs[(CONTAINER, "students.csv")]
+    blob.calls.clear()
+
+    assert azure_sb.upload_file_to_azure(csv_file, CONTAINER, "students.csv", use_ledger=False)
+    assert blob.calls == []
+
+    with open(csv_file, "ab") as f:
+        f.write(b"GP,F,18,12\n")
+    assert azure_sb.upload_file_to_azure(csv_file, CONTAINER, "students.csv", use_ledger=False)
+    assert blob.calls == ["upload_blob"]
+    assert blob.data == open(csv_file, "rb").read()
+
+
+def test_ledger_skips_hashing_unchanged_files(service, csv_file, monkeypatch):
+    assert azure_sb.upload_file_to_azure(csv_file, CONTAINER, "students.csv")
+    hashed = []
+    file_md5 = azure_sb.file_md5
+    monkeypatch.setattr(azure_sb, "file_md5", lambda path: hashed.append(path) or file_md5(path))
+
+    assert azure_sb.upload_file_to_azure(csv_file, CONTAINER, "students.csv")
+    assert hashed == []
+
+    # The blob was replaced behind the ledger's back: fall back to the MD5 check
+    blob = service.blobs[(CONTAINER, "students.csv")]
+    blob.etag = '"changed"'
+    assert azure_sb.upload_file_to_azure(csv_file, CONTAINER, "students.csv")
+    assert hashed == [csv_file]
+
+
+def test_overwrite_and_fail_if_exists(service, csv_file):
+    assert azure_sb.upload_file_to_azure(csv_file, CONTAINER, "students.csv")
+    blob = service.blobs[(CONTAINER, "students.csv")]
+    blob.calls.clear()
+
+    assert not azure_sb.upload_file_to_azure(csv_file, CONTAINER, "students.csv", mode="fail_if_exists")
+    assert blob.calls == []
+    assert azure_sb.upload_file_to_azure(csv_file, CONTAINER, "students.csv", mode="overwrite")
+    assert blob.calls == ["upload_blob"]
+    with pytest.raises(ValueError):
+        azure_sb.upload_file_to_azure(csv_file, CONTAINER, "students.csv", mode="replace")
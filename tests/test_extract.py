@@ -0,0 +1,97 @@
+import io
+import json
+import os
+import threading
+import zipfile
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+import extract
+
+
+def make_archive():
+    inner = io.BytesIO()
+    with zipfile.ZipFile(inner, "w") as z:
+        z.writestr("student-mat.csv", "school;sex;age\nGP;F;18\n")
+    outer = io.BytesIO()
+    with zipfile.ZipFile(outer, "w") as z:
+        z.writestr("student.zip", inner.getvalue())
+    return outer.getvalue()
+
+
+class Handler(BaseHTTPRequestHandler):
+    files = {}
+    requests = []
+
+    def do_GET(self):
+        self.requests.append((self.path, self.headers.get("If-None-Match")))
+        if self.path not in self.files:
+            self.send_error(404)
+            return
+        body, etag = self.files[self.path]
+        if etag and self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        if etag:
+            self.send_header("ETag", etag)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    Handler.files, Handler.requests = {}, []
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{httpd.server_port}"
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def test_download_revalidates_with_etag(server, tmp_path):
+    Handler.files["/student.zip"] = (b"v1", '"v1"')
+    url = server + "/student.zip"
+
+    path, downloaded = extract.download(url, str(tmp_path))
+    assert downloaded and open(path, "rb").read() == b"v1"
+    index = json.load(open(tmp_path / extract.HTTP_CACHE_INDEX))
+    assert index[url]["etag"] == '"v1"'
+
+    assert extract.download(url, str(tmp_path)) == (path, False)
+    assert Handler.requests[-1] == ("/student.zip", '"v1"')
+
+    Handler.files["/student.zip"] = (b"v2", '"v2"')
+    assert extract.download(url, str(tmp_path)) == (path, True)
+    assert open(path, "rb").read() == b"v2"
+
+
+def test_download_refetches_a_missing_cached_file(server, tmp_path):
+    Handler.files["/student.zip"] = (b"v1", '"v1"')
+    path, _ = extract.download(server + "/student.zip", str(tmp_path))
+    os.remove(path)
+    # Without the file a conditional request would get a 304 with nothing to reuse
+    assert extract.download(server + "/student.zip", str(tmp_path)) == (path, True)
+    assert Handler.requests[-1] == ("/student.zip", None)
+
+
+def test_extract_skips_unchanged_archives(server, tmp_path):
+    Handler.files["/dataset"] = (b'<a href="/static/student.zip">Download</a> <a href="#top">Top</a>', None)
+    Handler.files["/static/student.zip"] = (make_archive(), '"a1"')
+    cache_dir, extract_dir = str(tmp_path / "cache"), str(tmp_path / "data")
+
+    assert extract.find_dataset_links(server + "/dataset") == [server + "/static/student.zip"]
+    assert extract.extract_student_data(server + "/dataset", extract_dir, cache_dir) == extract_dir
+    csv_path = os.path.join(extract_dir, "student-mat.csv")
+    assert os.path.exists(csv_path)
+
+    os.utime(csv_path, (0, 0))
+    extract.extract_student_data(server + "/dataset", extract_dir, cache_dir)
+    # The archive was not modified, so nothing was extracted again
+    assert os.stat(csv_path).st_mtime == 0
+    assert Handler.requests[-1] == ("/static/student.zip", '"a1"')
@@ -0,0 +1,26 @@
+import pytest
+import metrics
+
+
+def allocate(mb):
+    block = bytearray(mb * 1024 * 1024)
+    # Touch every page so it is resident
+    block[::4096] = b"x" * len(block[::4096])
+    return block
+
+
+@pytest.mark.skipif(not metrics.reset_peak_rss(), reason="peak RSS can't be reset on this platform")
+def test_peak_rss_is_per_stage(monkeypatch):
+    records = []
+    monkeypatch.setattr(metrics, "emit", records.append)
+    monkeypatch.setattr(metrics, "PUSH_TO_XCOM", False)
+    with metrics.stage("outer"):
+        with metrics.stage("big"):
+            allocate(200)
+        with metrics.stage("small"):
+            allocate(10)
+    peaks = {record["stage"]: record["peak_rss_mb"] for record in records}
+    assert {record["peak_rss_scope"] for record in records} == {"stage"}
+    # The small stage doesn't carry forward the big stage's peak, the outer stage does
+    assert peaks["small"] < peaks["big"] - 150
+    assert peaks["outer"] >= peaks["big"]
@@ -0,0 +1,42 @@
+import os
+import pytest
+import render
+from transform import load_and_transform
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+AGGREGATE_PLOTS = ["pass_rate_by_subject", "pass_rate_by_gender"]
+
+
+@pytest.fixture
+def transformed(tmp_path, monkeypatch):
+    monkeypatch.setenv("PIPELINE_METRICS", "0")
+    csv_path = load_and_transform(os.path.join(ROOT, "data"), str(tmp_path / "output"))
+    parent = os.getpid()
+    real_read = render.read_transformed
+
+    def read_outside_parent(path):
+        # Forked render workers inherit this patch but may load the rows
+        assert os.getpid() != parent, "lazy render loaded the dataset in the calling process"
+        return real_read(path)
+
+    monkeypatch.setattr(render, "read_transformed", read_outside_parent)
+    return csv_path
+
+
+def test_lazy_render_never_loads_rows_in_process(transformed, tmp_path):
+    plots_dir = str(tmp_path / "plots")
+    names = AGGREGATE_PLOTS + ["average_grade_distribution"]
+    assert sorted(render.render_plots(transformed, plots_dir, names, workers=1, lazy=True)) == sorted(names)
+    assert all(os.path.exists(os.path.join(plots_dir, f"{name}.png")) for name in names)
+    # Fingerprints come from the data version, so nothing is stale the second time
+    assert render.render_plots(transformed, plots_dir, names, lazy=True) == []
+    # Plots drawn from the cube alone render here, without workers
+    assert render.render_plots(transformed, plots_dir, AGGREGATE_PLOTS, force=True, lazy=True) == AGGREGATE_PLOTS
+
+
+def test_data_version_follows_the_manifest(transformed):
+    version = render.data_version(transformed)
+    assert version == render.fingerprint(transformed)["sha256"]
+    with open(transformed, "a") as f:
+        f.write("\n")
+    assert render.data_version(transformed) != version
@@ -0,0 +1,134 @@
+import os
+import pytest
+from botocore.exceptions import ClientError
+from moto import mock_aws
+import s3_utils
+from upload_ledger import UploadLedger
+
+BUCKET = "students"
+# S3 rejects multipart parts under 5 MiB, except the last one
+PART_SIZE = 5 * 1024 * 1024
+
+
+@pytest.fixture
+def s3(tmp_path, monkeypatch):
+    monkeypatch.setenv("AWS_ACCESS_KEY_ID", "testing")
+    monkeypatch.setenv("AWS_SECRET_ACCESS_KEY", "testing")
+    monkeypatch.setenv("AWS_DEFAULT_REGION", "us-east-1")
+    monkeypatch.delenv("S3_ENDPOINT_URL", raising=False)
+    monkeypatch.setattr(s3_utils, "UPLOAD_STATE_DIR", str(tmp_path / "state"))
+    ledger = UploadLedger(str(tmp_path / "ledger.json"))
+    monkeypatch.setattr(s3_utils, "default_ledger", lambda: ledger)
+    with mock_aws():
+        s3_utils.get_s3_client.cache_clear()
+        client = s3_utils.get_s3_client()
+        client.create_bucket(Bucket=BUCKET)
+        yield client
+    s3_utils.get_s3_client.cache_clear()
+
+
+def write_file(path, size, fill=b"x"):
+    path.write_bytes(os.urandom(size // 2) + fill * (size - size // 2))
+    return str(path)
+
+
+def read_object(client, key):
+    return client.get_object(Bucket=BUCKET, Key=key)["Body"].read()
+
+
+def test_resumable_upload_only_resends_missing_parts(s3, tmp_path, monkeypatch):
+    file_name = write_file(tmp_path / "big.bin", 2 * PART_SIZE + 1000)
+    config = s3_utils.transfer_config(multipart_threshold=PART_SIZE, multipart_chunksize=PART_SIZE, max_concurrency=1)
+
+    real_upload_part = s3.upload_part
+    failed = []
+    sent = []
+
+    def failing_upload_part(**kwargs):
+        if kwargs["PartNumber"] == 2 and not failed:
+            failed.append(2)
+            raise ConnectionError("connection dropped")
+        sent.append(kwargs["PartNumber"])
+        return real_upload_part(**kwargs)
+
+    monkeypatch.setattr(s3, "upload_part", failing_upload_part)
+    with pytest.raises(ConnectionError):
+        s3_utils.resumable_upload(file_name, BUCKET, "big.bin", config)
+    assert os.listdir(s3_utils.UPLOAD_STATE_DIR)
+
+    first_attempt = set(sent)
+    sent.clear()
+    s3_utils.resumable_upload(file_name, BUCKET, "big.bin", config)
+    # Only the parts that never reached S3 are sent again
+    assert 2 in sent and not first_attempt & set(sent)
+    assert first_attempt | set(sent) == {1, 2, 3}
+    assert read_object(s3, "big.bin") == open(file_name, "rb").read()
+    assert not os.listdir(s3_utils.UPLOAD_STATE_DIR)
+
+
+def test_resume_restarts_when_the_file_changed(s3, tmp_path, monkeypatch):
+    file_name = write_file(tmp_path / "big.bin", 2 * PART_SIZE)
+    config = s3_utils.transfer_config(multipart_threshold=PART_SIZE, multipart_chunksize=PART_SIZE, max_concurrency=1)
+    real_upload_part = s3.upload_part
+
+    def fail_second(**kwargs):
+        if kwargs["PartNumber"] == 2:
+            raise ConnectionError("connection dropped")
+        return real_upload_part(**kwargs)
+
+    monkeypatch.setattr(s3, "upload_part", fail_second)
+    with pytest.raises(ConnectionError):
+        s3_utils.resumable_upload(file_name, BUCKET, "big.bin", config)
+    monkeypatch.setattr(s3, "upload_part", real_upload_part)
+
+    write_file(tmp_path / "big.bin", 2 * PART_SIZE + 10, fill=b"y")
+    s3_utils.resumable_upload(file_name, BUCKET, "big.bin", config)
+    assert read_object(s3, "big.bin") == open(file_name, "rb").read()
+    # The stale upload was aborted rather than left behind
+    assert s3.list_multipart_uploads(Bucket=BUCKET).get("Uploads", []) == []
+
+
+def test_unresumable_upload_is_aborted(s3, tmp_path, monkeypatch):
+    file_name = write_file(tmp_path / "big.bin", 2 * PART_SIZE)
+    config = s3_utils.transfer_config(multipart_threshold=PART_SIZE, multipart_chunksize=PART_SIZE, max_concurrency=1)
+    real_upload_part = s3.upload_part
+
+    def fail_second(**kwargs):
+        if kwargs["PartNumber"] == 2:
+            raise ConnectionError("connection dropped")
+        return real_upload_part(**kwargs)
+
+    monkeypatch.setattr(s3, "upload_part", fail_second)
+    with pytest.raises(ConnectionError):
+        s3_utils.resumable_upload(file_name, BUCKET, "big.bin", config)
+    monkeypatch.setattr(s3, "upload_part", real_upload_part)
+
+    def list_parts_denied(*args, **kwargs):
+        raise ClientError({"Error": {"Code": "AccessDenied"}}, "ListParts")
+
+    monkeypatch.setattr(s3_utils, "_uploaded_parts", list_parts_denied)
+    s3_utils.resumable_upload(file_name, BUCKET, "big.bin", config)
+    assert read_object(s3, "big.bin") == open(file_name, "rb").read()
+    assert s3.list_multipart_uploads(Bucket=BUCKET).get("Uploads", []) == []
+
+
+def test_upload_is_skipped_while_file_and_object_are_unchanged(s3, tmp_path, monkeypatch):
+    file_name = write_file(tmp_path / "small.csv", 1000)
+    assert s3_utils.upload_file_to_s3(file_name, BUCKET, "small.csv")
+
+    uploads = []
+    real_upload_file = s3.upload_file
+    monkeypatch.setattr(s3, "upload_file", lambda *args, **kwargs: uploads.append(args) or real_upload_file(*args, **kwargs))
+    assert s3_utils.upload_file_to_s3(file_name, BUCKET, "small.csv")
+    assert uploads == []
+
+    # Someone else replaced the object: the ledger's ETag no longer matches
+    s3.put_object(Bucket=BUCKET, Key="small.csv", Body=b"other")
+    assert s3_utils.upload_file_to_s3(file_name, BUCKET, "small.csv")
+    assert len(uploads) == 1
+    assert read_object(s3, "small.csv") == open(file_name, "rb").read()
+
+    # The local file changed
+    write_file(tmp_path / "small.csv", 1200, fill=b"z")
+    assert s3_utils.upload_file_to_s3(file_name, BUCKET, "small.csv")
+    assert len(uploads) == 2
@@ -0,0 +1,28 @@
+import os
+import pytest
+import transform
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATA_DIR = os.path.join(ROOT, "data")
+
+
+def test_failed_forced_rebuild_is_not_reused(tmp_path, monkeypatch):
+    monkeypatch.setenv("PIPELINE_METRICS", "0")
+    output_dir = str(tmp_path)
+    built = transform.transform_partition("Math", "student-mat.csv", DATA_DIR, output_dir)
+    assert built["changed"]
+
+    def crash(path, subject, partition_path, *args):
+        with open(partition_path, "w") as f:
+            f.write("half-written")
+        raise MemoryError("killed mid-rebuild")
+
+    monkeypatch.setattr(transform, "transform_subject", crash)
+    with pytest.raises(MemoryError):
+        transform.transform_partition("Math", "student-mat.csv", DATA_DIR, output_dir, force=True)
+    monkeypatch.undo()
+
+    rebuilt = transform.transform_partition("Math", "student-mat.csv", DATA_DIR, output_dir)
+    assert rebuilt["changed"]
+    with open(rebuilt["partition"]) as f:
+        assert f.read() != "half-written"
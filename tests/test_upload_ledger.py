@@ -0,0 +1,32 @@
+import multiprocessing
+import os
+import pytest
+from upload_ledger import UploadLedger, fcntl
+
+
+def record_targets(path, worker, count):
+    ledger = UploadLedger(path)
+    for i in range(count):
+        ledger.record(f"s3://bucket/{worker}-{i}", {"size": i, "mtime": 0.0, "sha256": "x"}, f'"{i}"')
+
+
+@pytest.mark.skipif(fcntl is None, reason="needs fcntl")
+def test_concurrent_processes_keep_each_others_entries(tmp_path):
+    path = str(tmp_path / "ledger.json")
+    context = multiprocessing.get_context("spawn")
+    workers = [context.Process(target=record_targets, args=(path, worker, 30)) for worker in range(4)]
+    for process in workers:
+        process.start()
+    for process in workers:
+        process.join()
+    assert all(process.exitcode == 0 for process in workers)
+    assert len(UploadLedger(path)._read()) == 4 * 30
+
+
+def test_forget_removes_only_its_target(tmp_path):
+    ledger = UploadLedger(str(tmp_path / "ledger.json"))
+    ledger.record("s3://bucket/a", {"size": 1, "mtime": 0.0, "sha256": "x"}, '"a"')
+    ledger.record("s3://bucket/b", {"size": 1, "mtime": 0.0, "sha256": "x"}, '"b"')
+    ledger.forget("s3://bucket/a")
+    assert list(UploadLedger(ledger.path)._read()) == ["s3://bucket/b"]
+    assert os.path.exists(ledger.path + ".lock")